@@ -1,14 +1,47 @@
 import os
 import re
+import asyncio
 import base64
+import hashlib
+import json
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Body, Request
+from fastapi.responses import Response, StreamingResponse
+from app.service.cache import LRUCache
+from app.service.bmp_region import open_bmp, read_region
+from app.service.share_io import IMAGE_ROOT, SHARE_IO_TIMEOUT, run_share_io
 
 router = APIRouter()
 
+MASTER_CACHE_BYTES = int(os.getenv("PMS_MASTER_CACHE_MB", 2048)) * 1024 * 1024
+
+# Decoded masters keyed by (path, mtime); a rewritten bmp gets a new key.
+master_cache = LRUCache(maxsize=64, max_bytes=MASTER_CACHE_BYTES, sizeof=lambda img: img.nbytes)
+
+# Decodes are serialized per master through a fixed set of striped locks, so
+# the lock table stays bounded however many masters pass through the cache.
+MASTER_LOCK_STRIPES = 64
+master_locks = [threading.Lock() for _ in range(MASTER_LOCK_STRIPES)]
+
+# Crops served straight from an uncompressed bmp never touch master_cache;
+# they are counted here instead of as cache misses.
+mmap_stats = {"groups": 0, "crops": 0}
+mmap_stats_lock = threading.Lock()
+
+def master_lock(path):
+    return master_locks[zlib.crc32(path.encode("utf-8")) % MASTER_LOCK_STRIPES]
+
+# cv2 releases the GIL while cropping, resizing and encoding.
+GERBER_WORKERS = int(os.getenv("PMS_GERBER_WORKERS", 4))
+crop_pool = ThreadPoolExecutor(max_workers=GERBER_WORKERS, thread_name_prefix="gerber")
+
 def get_master_image_path(json_path: str) -> str:
-    base_path = r"\\10.0.0.225\ati\VS DATA"
+    base_path = IMAGE_ROOT
 
     json_path = json_path.replace("/", "\\")
 
@@ -42,14 +75,9 @@ def get_master_image_path(json_path: str) -> str:
         f"{item_code}_Master_Unit.bmp"
     )
 
-    print(master_path)
-
     return master_path
 
-def crop_image(image, center_x, center_y, crop_size):
-
-    height, width = image.shape[:2]
-
+def crop_window(width, height, center_x, center_y, crop_size):
     cx = int(width * center_x)
     cy = int(height * center_y)
 
@@ -58,33 +86,108 @@ def crop_image(image, center_x, center_y, crop_size):
     x1, y1 = cx - half, cy - half
     x2, y2 = cx + half, cy + half
 
-    result = np.zeros((crop_size, crop_size), dtype=np.uint8)
+    copy = (max(0, x1), max(0, y1), min(width, x2), min(height, y2))
+    paste = (max(0, -x1), max(0, -y1))
 
-    copy_x1 = max(0, x1)
-    copy_x2 = min(width, x2)
-    copy_y1 = max(0, y1)
-    copy_y2 = min(height, y2)
+    return copy, paste
 
-    paste_x1 = max(0, -x1)
-    paste_y1 = max(0, -y1)
+def paste_crop(region, paste, crop_size):
+    result = np.zeros((crop_size, crop_size), dtype=np.uint8)
 
-    result[paste_y1:paste_y1 + (copy_y2 - copy_y1),
-           paste_x1:paste_x1 + (copy_x2 - copy_x1)] = image[copy_y1:copy_y2, copy_x1:copy_x2]
+    paste_x1, paste_y1 = paste
+    h, w = region.shape[:2]
+    result[paste_y1:paste_y1 + h, paste_x1:paste_x1 + w] = region
 
     return result
 
+def crop_image(image, center_x, center_y, crop_size):
+
+    height, width = image.shape[:2]
+
+    (x1, y1, x2, y2), paste = crop_window(width, height, center_x, center_y, crop_size)
+
+    return paste_crop(image[y1:y2, x1:x2], paste, crop_size)
+
+def decode_master(path):
+    with open(path, "rb") as f:
+        bytes_arr = np.frombuffer(f.read(), dtype=np.uint8)
+    return cv2.imdecode(bytes_arr, cv2.IMREAD_GRAYSCALE)
+
+def load_master_image(path):
+    key = (path, os.path.getmtime(path))
+    full = master_cache.get(key)
+    if full is not None:
+        return full
+
+    # One decode per master even when several crops for it arrive at once.
+    with master_lock(path):
+        full = master_cache.peek(key)
+        if full is None:
+            full = decode_master(path)
+            if full is not None:
+                full.flags.writeable = False
+                master_cache.set(key, full)
+
+    return full
+
+def crop_group(path, crops):
+    # crops: [(key, center_x, center_y, crop_size)] on one master; yields
+    # (key, image) so the master is opened or decoded once for the group.
+    full = master_cache.peek((path, os.path.getmtime(path)))
+
+    if full is None:
+        # Uncompressed bmp: only the rows under each crop window are read.
+        with open_bmp(path) as (mm, header):
+            if header is not None:
+                with mmap_stats_lock:
+                    mmap_stats["groups"] += 1
+                    mmap_stats["crops"] += len(crops)
+                for key, center_x, center_y, crop_size in crops:
+                    (x1, y1, x2, y2), paste = crop_window(
+                        header["width"], header["height"], center_x, center_y, crop_size
+                    )
+                    if x1 >= x2 or y1 >= y2:
+                        yield key, np.zeros((crop_size, crop_size), dtype=np.uint8)
+                    else:
+                        yield key, paste_crop(read_region(mm, header, x1, y1, x2, y2), paste, crop_size)
+                return
+
+    full = load_master_image(path)
+
+    for key, center_x, center_y, crop_size in crops:
+        yield key, None if full is None else crop_image(full, center_x, center_y, crop_size)
+
+def crop_master(path, center_x, center_y, crop_size):
+    _, cropped = next(crop_group(path, [(None, center_x, center_y, crop_size)]))
+    return cropped
+
+IMAGE_FORMATS = {
+    "png": ("image/png", ".png", []),
+    "webp": ("image/webp", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 90]),
+}
+
+GERBER_CACHE_CONTROL = "private, max-age=86400"
+
+def encode_bytes(img, fmt="png"):
+    _, ext, params = IMAGE_FORMATS[fmt]
+    _, buffer = cv2.imencode(ext, img, params)
+    return buffer.tobytes()
+
 def encode_img(img):
-    _, buffer = cv2.imencode(".png", img)
-    return base64.b64encode(buffer).decode("utf-8")
+    return base64.b64encode(encode_bytes(img)).decode("utf-8")
 
-@router.get("/image/gerber")
-def get_gerber_crop(json_path: str = Query(..., allow_reserved=True), cx: str = Query(...), cy: str = Query(...), defect_width:str = Query(...), defect_height: str = Query(...)):
+def crop_etag(gerber_path, cx, cy, crop_size, fmt):
+    # A rewritten master changes mtime, so cached crops of it go stale.
+    key = f"{gerber_path}|{os.path.getmtime(gerber_path)}|{cx}|{cy}|{crop_size}|{fmt}"
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+
+def parse_crop_request(json_path, cx, cy, defect_width, defect_height):
 
     try:
-        cx = float(cx.strip())
-        cy = float(cy.strip())
-        defect_width = float(defect_width.strip())
-        defect_height = float( defect_height.strip())
+        cx = float(str(cx).strip())
+        cy = float(str(cy).strip())
+        defect_width = float(str(defect_width).strip())
+        defect_height = float(str(defect_height).strip())
     except Exception:
         raise HTTPException(400, "cx, cy, width, height 값 숫자 변환 실패 ")
 
@@ -98,18 +201,139 @@ def get_gerber_crop(json_path: str = Query(..., allow_reserved=True), cx: str =
     if not os.path.exists(gerber_path):
         raise HTTPException(status_code=404, detail="Gerber 파일 없음.")
 
-    with open(gerber_path, "rb") as f:
-        bytes_arr = np.asarray(bytearray(f.read()), dtype=np.uint8)
-        full = cv2.imdecode(bytes_arr, cv2.IMREAD_GRAYSCALE)
-
-    if full is None:
-        raise HTTPException(status_code=500, detail="이미지 로드 실패")
-
-    cropped = crop_image(full, cx, cy, crop_size)
+    return gerber_path, cx, cy, crop_size
 
-    final_img = cv2.resize(cropped, (400, 400), interpolation=cv2.INTER_AREA)
+def resize_crop(cropped):
+    return cv2.resize(cropped, (400, 400), interpolation=cv2.INTER_AREA)
 
+def render_crop(cropped, crop_size):
     return {
         "crop_size": crop_size,
-        "image": encode_img(final_img)
+        "image": encode_img(resize_crop(cropped))
     }
+
+def load_gerber_crop(json_path, cx, cy, defect_width, defect_height, fmt, if_none_match):
+    gerber_path, cx, cy, crop_size = parse_crop_request(json_path, cx, cy, defect_width, defect_height)
+
+    headers = {}
+    if fmt != "json":
+        headers = {
+            "ETag": crop_etag(gerber_path, cx, cy, crop_size, fmt),
+            "Cache-Control": GERBER_CACHE_CONTROL,
+            "X-Crop-Size": str(crop_size),
+        }
+        if if_none_match == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+
+    cropped = crop_master(gerber_path, cx, cy, crop_size)
+
+    if cropped is None:
+        raise HTTPException(status_code=500, detail="이미지 로드 실패")
+
+    if fmt == "json":
+        return render_crop(cropped, crop_size)
+
+    return Response(
+        encode_bytes(resize_crop(cropped), fmt),
+        media_type=IMAGE_FORMATS[fmt][0],
+        headers=headers,
+    )
+
+@router.get("/image/gerber")
+async def get_gerber_crop(request: Request, json_path: str = Query(..., allow_reserved=True), cx: str = Query(...), cy: str = Query(...), defect_width:str = Query(...), defect_height: str = Query(...), format: str = Query("json")):
+
+    if format != "json" and format not in IMAGE_FORMATS:
+        raise HTTPException(400, "format 은 json, png, webp 중 하나")
+
+    return await run_share_io(
+        load_gerber_crop, json_path, cx, cy, defect_width, defect_height,
+        format, request.headers.get("if-none-match"),
+    )
+
+def parse_batch_item(index, item):
+    if not isinstance(item, dict):
+        return index, {"index": index, "status": 400, "detail": "item 형식 오류"}
+    try:
+        return index, parse_crop_request(
+            item.get("json_path"), item.get("cx"), item.get("cy"),
+            item.get("defect_width"), item.get("defect_height"),
+        )
+    except HTTPException as e:
+        return index, {"index": index, "status": e.status_code, "detail": e.detail}
+
+@router.post("/image/gerber/batch")
+async def get_gerber_crops(items: list = Body(...)):
+    # One line of NDJSON per item, in completion order; "index" points back
+    # into the request list.
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue()
+
+    def put(result):
+        loop.call_soon_threadsafe(results.put_nowait, result)
+
+    parsed = await run_share_io(
+        lambda: [parse_batch_item(index, item) for index, item in enumerate(items)]
+    )
+
+    groups = defaultdict(list)
+    for index, crop in parsed:
+        if isinstance(crop, dict):
+            put(crop)
+        else:
+            gerber_path, cx, cy, crop_size = crop
+            groups[gerber_path].append((index, cx, cy, crop_size))
+
+    def render(index, cropped, crop_size):
+        try:
+            put({"index": index, **render_crop(cropped, crop_size)})
+        except Exception as e:
+            put({"index": index, "status": 500, "detail": str(e)})
+
+    def read_group(gerber_path, crops):
+        return list(crop_group(gerber_path, crops))
+
+    async def run_group(gerber_path, crops):
+        # The share read goes through run_share_io (its executor, limit and
+        # timeout); only the encoding runs on crop_pool.
+        pending = {index: crop_size for index, _, _, crop_size in crops}
+        try:
+            for index, cropped in await run_share_io(read_group, gerber_path, crops):
+                crop_size = pending.pop(index)
+                if cropped is None:
+                    put({"index": index, "status": 500, "detail": "이미지 로드 실패"})
+                else:
+                    crop_pool.submit(render, index, cropped, crop_size)
+        except HTTPException as e:
+            for index in pending:
+                put({"index": index, "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            for index in pending:
+                put({"index": index, "status": 500, "detail": str(e)})
+
+    tasks = [
+        asyncio.create_task(run_group(gerber_path, crops))
+        for gerber_path, crops in groups.items()
+    ]
+
+    async def stream():
+        done = set()
+        try:
+            while len(done) < len(items):
+                result = await asyncio.wait_for(results.get(), SHARE_IO_TIMEOUT)
+                done.add(result["index"])
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except asyncio.TimeoutError:
+            for index in range(len(items)):
+                if index not in done:
+                    yield json.dumps({"index": index, "status": 504, "detail": "시간 초과"}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/image/gerber/cache")
+def get_gerber_cache_stats():
+    with mmap_stats_lock:
+        mmap = dict(mmap_stats)
+    return {**master_cache.stats(), "mmap": mmap}
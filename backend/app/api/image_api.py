@@ -0,0 +1,186 @@
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.service.share_io import resolve_image_path, run_share_io
+from app.service.http_range import parse_range
+from app.service.image_variants import (
+    THUMB_SIZES,
+    TILE_SIZE,
+    variant_key,
+    cached_variant,
+    build_thumbnail,
+    build_tile,
+    image_size,
+    tile_levels,
+)
+
+router = APIRouter(tags=["Images"])
+
+IMAGE_CACHE_CONTROL = "public, max-age=3600"
+VARIANT_CACHE_CONTROL = "public, max-age=604800"
+
+# Bodies up to this size are read in one share call; larger ones are
+# streamed, one share call per chunk.
+IMAGE_READ_WHOLE_BYTES = int(os.getenv("PMS_IMAGE_READ_WHOLE_KB", 4096)) * 1024
+IMAGE_CHUNK = 1024 * 1024
+
+
+def source_path(path):
+    resolved = resolve_image_path(path)
+    if resolved is None or not os.path.isfile(resolved):
+        raise HTTPException(404, "이미지 없음.")
+    return resolved
+
+
+def not_modified(request, etag):
+    return request.headers.get("if-none-match") == etag
+
+
+def stat_source(path):
+    src = source_path(path)
+    return src, os.stat(src)
+
+
+def modified_since(request, mtime):
+    since = request.headers.get("if-modified-since")
+    if not since:
+        return True
+    try:
+        return int(mtime) > parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return True
+
+
+def image_headers(st):
+    return {
+        "ETag": f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+    }
+
+
+def range_applies(request, headers):
+    # If-Range: serve the range only while the validator still matches.
+    if_range = request.headers.get("if-range")
+    return if_range is None or if_range in (headers["ETag"], headers["Last-Modified"])
+
+
+def read_file_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+async def iter_share_file(path, start, end):
+    f = await run_share_io(open, path, "rb")
+    try:
+        await run_share_io(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await run_share_io(f.read, min(IMAGE_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_share_io(f.close)
+
+
+@router.api_route("/images/{path:path}", methods=["GET", "HEAD"])
+async def get_image(path: str, request: Request):
+    # Every share access (stat, open, reads) goes through run_share_io.
+    src, st = await run_share_io(stat_source, path)
+    headers = image_headers(st)
+
+    if not_modified(request, headers["ETag"]) or (
+        "if-none-match" not in request.headers and not modified_since(request, st.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(src)[0] or "application/octet-stream"
+    headers["Accept-Ranges"] = "bytes"
+
+    size = st.st_size
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and size and range_applies(request, headers):
+        start, end = parse_range(range_header, size)
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD" or not length:
+        return Response(status_code=status, headers=headers, media_type=media_type)
+
+    if length <= IMAGE_READ_WHOLE_BYTES:
+        data = await run_share_io(read_file_range, src, start, length)
+        return Response(data, status_code=status, headers=headers, media_type=media_type)
+
+    return StreamingResponse(
+        iter_share_file(src, start, end), status_code=status, headers=headers, media_type=media_type
+    )
+
+
+def load_variant(path, params, build):
+    src = source_path(path)
+    key = variant_key(src, *params)
+    return key, lambda: cached_variant(key, lambda: build(src))
+
+
+async def variant_response(request, path, params, build):
+    key, load = await run_share_io(load_variant, path, params, build)
+
+    headers = {"ETag": f'"{key}"', "Cache-Control": VARIANT_CACHE_CONTROL}
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    data = await run_share_io(load)
+    if data is None:
+        raise HTTPException(404, "이미지 변환 실패")
+
+    return Response(data, media_type="image/webp", headers=headers)
+
+
+@router.get("/thumbs/{size}/{path:path}")
+async def get_thumbnail(size: int, path: str, request: Request):
+    if size not in THUMB_SIZES:
+        raise HTTPException(400, f"size 는 {THUMB_SIZES} 중 하나")
+
+    return await variant_response(
+        request, path, ("thumb", size), lambda src: build_thumbnail(src, size)
+    )
+
+
+def load_tile_meta(path):
+    size = image_size(source_path(path))
+    if size is None:
+        raise HTTPException(500, "이미지 로드 실패")
+
+    width, height = size
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": TILE_SIZE,
+        "levels": tile_levels(width, height),
+    }
+
+
+@router.get("/tiles/meta/{path:path}")
+async def get_tile_meta(path: str):
+    return await run_share_io(load_tile_meta, path)
+
+
+@router.get("/tiles/{level}/{col}/{row}/{path:path}")
+async def get_tile(level: int, col: int, row: int, path: str, request: Request):
+    if level < 0 or col < 0 or row < 0 or level > 16:
+        raise HTTPException(400, "tile 좌표 오류")
+
+    return await variant_response(
+        request, path, ("tile", level, col, row), lambda src: build_tile(src, level, col, row)
+    )
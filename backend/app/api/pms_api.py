@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, distinct
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy import select, distinct
 from datetime import datetime
-from typing import List, Dict
 from sqlalchemy import cast, DateTime
 
-from app.database import get_db
+from app.database import get_lookup_db, get_async_query_db
 from app.model.inspection_result import inspection_result
+from app.service.query_build import ITEMCODE, LOT_KEY
+from app.service.fast_json import FastJSONResponse
 
 router = APIRouter(prefix="/api/pms")
 
@@ -18,15 +20,13 @@ def extract_itemcode_from_filename(name: str):
     return base.split("_")[0]
 
 
-itemcode_expr = func.split_part(
-    func.split_part(inspection_result.c.file_name, "/", -1),
-    "_",
-    1
-)
+# Column reads on mv_inspection_result (indexed), split_part/trim otherwise.
+itemcode_expr = ITEMCODE.element
+lot_key_expr = LOT_KEY.element
 
 
 @router.get("/search")
-def pms_search(
+async def pms_search(
     machine: str = None,
     item: str = None,
     lot: str = None,
@@ -34,7 +34,7 @@ def pms_search(
     startDate: str = None,
     endDate: str = None,
     text: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncConnection = Depends(get_async_query_db)
 ):
     ai_dt = cast(inspection_result.c.ai_date_time, DateTime)
 
@@ -80,7 +80,7 @@ def pms_search(
             itemcode_expr.ilike(f"%{text}%") | inspection_result.c.lot_no.ilike(f"%{text}%")
         )
 
-    rows = db.execute(stmt).fetchall()
+    rows = (await db.execute(stmt)).fetchall()
 
     groups = {}
     for r in rows:
@@ -96,18 +96,18 @@ def pms_search(
                 "ai_dt": r.ai_date_time,
             }
 
-    return list(groups.values())
+    return FastJSONResponse(list(groups.values()))
 
 
 @router.get("/machines")
-def get_machines(db: Session = Depends(get_db)):
+def get_machines(db: Connection = Depends(get_lookup_db)):
     stmt = select(distinct(inspection_result.c.inspection_machine))
     rows = db.execute(stmt).fetchall()
     return [{"label": r[0], "value": r[0]} for r in rows if r[0]]
 
 
 @router.get("/items")
-def get_items(machine: str, db: Session = Depends(get_db)):
+def get_items(machine: str, db: Connection = Depends(get_lookup_db)):
     stmt = select(distinct(itemcode_expr)).where(
         inspection_result.c.inspection_machine == machine
     )
@@ -116,7 +116,7 @@ def get_items(machine: str, db: Session = Depends(get_db)):
 
 
 @router.get("/lots")
-def get_lots(item: str, db: Session = Depends(get_db)):
+def get_lots(item: str, db: Connection = Depends(get_lookup_db)):
     stmt = select(distinct(inspection_result.c.lot_no)).where(
         itemcode_expr == item
     )
@@ -125,9 +125,9 @@ def get_lots(item: str, db: Session = Depends(get_db)):
 
 
 @router.get("/sorter")
-def get_trials(lot: str, db: Session = Depends(get_db)):
+def get_trials(lot: str, db: Connection = Depends(get_lookup_db)):
     stmt = select(distinct(inspection_result.c.bundle_no)).where(
-        func.trim(func.upper(inspection_result.c.lot_no)) == lot.strip().upper()
+        lot_key_expr == lot.strip().upper()
     )
     rows = db.execute(stmt).fetchall()
     return [{"label": r[0], "value": r[0]} for r in rows if r[0]]
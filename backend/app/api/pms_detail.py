@@ -1,19 +1,29 @@
-from fastapi import APIRouter, Depends, Body
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, cast, Float
-from app.database import get_db
+import asyncio
+import json
+from operator import itemgetter
+
+from fastapi import APIRouter, Depends, Body, HTTPException
+from sqlalchemy.engine import Connection
+from sqlalchemy import select, func, cast, distinct, Float
+from app.database import get_query_db, fetch_all, fetch_one
 from app.model.inspection_result import inspection_result
 from app.service.query_build import NORMALIZED_RESULT, PRIORITY
-from app.service.data_service import safe_float, build_summary_from_sql, load_detail_header
+from app.service.data_service import safe_float, load_detail_header
+from app.service.summary_store import load_detail_summary_async
+from app.service.cache import LRUCache
+from app.service.fast_json import FastJSONResponse
+from app.service.coerce import coerce_values
+from app.service.keyset import keyset_order, keyset_after, encode_cursor, decode_cursor
+from app.service.heatmap import HEATMAP_BINS, MAX_HEATMAP_BINS, load_heatmap
 
 router = APIRouter(prefix="/api/pms/detail", tags=["PMS Detail"])
 
 @router.get("/{test_id}")
-def get_detail_header(test_id: int, db: Session = Depends(get_db)):
+def get_detail_header(test_id: int, db: Connection = Depends(get_query_db)):
     return load_detail_header(db, test_id)
 
 @router.get("/{test_id}/sorter")
-def get_trials(test_id: int, db: Session = Depends(get_db)):
+def get_trials(test_id: int, db: Connection = Depends(get_query_db)):
     stmt = (
         select(inspection_result.c.bundle_no)
         .where(inspection_result.c.test_id == test_id)
@@ -26,29 +36,23 @@ def get_trials(test_id: int, db: Session = Depends(get_db)):
 
     return [{"label": r.bundle_no, "value": r.bundle_no} for r in rows]
 
-@router.get("/{test_id}/unique-values")
-def get_unique_values(
-    test_id: int,
-    type: str = "point",
-    sorters: str | None = None,
-    db: Session = Depends(get_db),
-):
+UNIQUE_COLUMNS = [
+    "strip_id", "bundle_no", "defect_code",
+    "afvi_ai_keyin", "afvi_ai_defect", "afvi_clf_defect", "afvi_false_defect","ivs_keyin1"
+]
 
-    sorter_list = sorters.split(",") if sorters else None
+unique_values_cache = LRUCache(maxsize=256, ttl=600)
+
+def unique_values_stmt(test_id, type, sorter_list):
 
     base = select(
-        inspection_result.c.strip_id,
-        inspection_result.c.bundle_no,
-        inspection_result.c.defect_code,
-        inspection_result.c.afvi_ai_keyin,
-        inspection_result.c.afvi_ai_defect,
-        inspection_result.c.afvi_clf_defect,
-        inspection_result.c.ivs_keyin1,
+        *[getattr(inspection_result.c, col) for col in UNIQUE_COLUMNS],
         NORMALIZED_RESULT.label("norm")
     ).where(inspection_result.c.test_id == test_id)
 
     if sorter_list:
-        base = base.where(inspection_result.c.bundle_no.in_(sorter_list))
+        bundle_no = inspection_result.c.bundle_no
+        base = base.where(bundle_no.in_(coerce_values(bundle_no, sorter_list)))
 
     if type in ["unit", "underkill", "overkill"]:
 
@@ -77,21 +81,18 @@ def get_unique_values(
             & ((inspection_result.c.ivs_keyin1 == "") | (inspection_result.c.ivs_keyin1 == "Good"))
         )
 
-    rows = db.execute(base).fetchall()
+    sub = base.subquery()
 
-    target_columns = [
-        "strip_id", "bundle_no", "defect_code",
-        "afvi_ai_keyin", "afvi_ai_defect", "afvi_clf_defect", "afvi_false_defect","ivs_keyin1"
-    ]
+    # One scan: every column's distinct set is aggregated in the same pass.
+    return select(*[func.array_agg(distinct(sub.c[col])).label(col) for col in UNIQUE_COLUMNS])
 
+def shape_unique_values(row):
     result = {}
 
-    for col in target_columns:
+    for col in UNIQUE_COLUMNS:
         values = set()
 
-        for r in rows:
-            val = r._mapping.get(col)
-
+        for val in row._mapping[col] or []:
             if val in [None, ""]:
                 values.add("N/A")  
             else:
@@ -105,15 +106,70 @@ def get_unique_values(
 
     return result
 
-@router.post("/{test_id}/data")
-def get_detail_data(test_id: int, payload: dict = Body(...), db: Session = Depends(get_db)):
+@router.get("/{test_id}/unique-values")
+async def get_unique_values(
+    test_id: int,
+    type: str = "point",
+    sorters: str | None = None,
+):
 
-    mode = payload.get("mode", "point")
-    page = payload.get("page", 1)
-    size = payload.get("size", 100)
-    filters = payload.get("filters", {})
-    sort = payload.get("sort")
-    sorters = payload.get("sorters", [])
+    sorter_list = sorters.split(",") if sorters else None
+
+    key = (test_id, type, tuple(sorted(sorter_list)) if sorter_list else None)
+
+    result = unique_values_cache.get(key)
+    if result is None:
+        row = await fetch_one(unique_values_stmt(test_id, type, sorter_list))
+        result = shape_unique_values(row)
+        unique_values_cache.set(key, result)
+
+    return FastJSONResponse(result)
+
+DETAIL_TOTAL_TTL = 600
+
+VISIBLE_COLUMNS = (
+    "strip_id", "defect_code", "afvi_ai_keyin", "afvi_ai_defect", "afvi_false_defect",
+    "afvi_clf_defect", "afvi_ai_longest", "afvi_ai_gv",
+    "ivs_keyin1", "image_path",
+    # Not shown in the grid; the gerber crop requests are built from these.
+    "file_name", "rel_x_unit", "rel_y_unit", "defect_width", "defect_height",
+)
+
+# Low-cardinality columns sent as a value list plus per-row indexes.
+DICTIONARY_COLUMNS = ("afvi_ai_keyin", "afvi_ai_defect", "ivs_keyin1")
+
+def visible_rows(rows):
+    # Projected by position instead of filtering every mapping key.
+    if not rows:
+        return []
+    project = itemgetter(*(rows[0]._fields.index(k) for k in VISIBLE_COLUMNS))
+    return [dict(zip(VISIBLE_COLUMNS, project(r))) for r in rows]
+
+def dictionary_encode(values):
+    codes = {}
+    encoded = [None if v is None else codes.setdefault(v, len(codes)) for v in values]
+    return list(codes), encoded
+
+def columnar_rows(rows):
+    # {columns, data, dictionaries}: data holds one list per column.
+    fields = rows[0]._fields if rows else VISIBLE_COLUMNS
+    data, dictionaries = [], {}
+    for name in VISIBLE_COLUMNS:
+        values = list(map(itemgetter(fields.index(name)), rows))
+        if name in DICTIONARY_COLUMNS:
+            dictionaries[name], values = dictionary_encode(values)
+        data.append(values)
+
+    return {
+        "format": "columnar",
+        "columns": list(VISIBLE_COLUMNS),
+        "data": data,
+        "dictionaries": dictionaries,
+    }
+
+detail_totals = LRUCache(maxsize=512, ttl=DETAIL_TOTAL_TTL)
+
+def build_detail_stmt(test_id, mode, filters, sorters, sort_field):
 
     stmt = select(
         inspection_result.c.strip_id,
@@ -126,6 +182,11 @@ def get_detail_data(test_id: int, payload: dict = Body(...), db: Session = Depen
         inspection_result.c.afvi_ai_gv,
         inspection_result.c.ivs_keyin1,
         inspection_result.c.image_path,
+        inspection_result.c.file_name,
+        inspection_result.c.rel_x_unit,
+        inspection_result.c.rel_y_unit,
+        inspection_result.c.defect_width,
+        inspection_result.c.defect_height,
         NORMALIZED_RESULT,
         PRIORITY,
         inspection_result.c.bundle_no,
@@ -135,11 +196,15 @@ def get_detail_data(test_id: int, payload: dict = Body(...), db: Session = Depen
     ).where(inspection_result.c.test_id == test_id)
 
     if sorters:
-        stmt = stmt.where(inspection_result.c.bundle_no.in_(sorters))
+        bundle_no = inspection_result.c.bundle_no
+        stmt = stmt.where(bundle_no.in_(coerce_values(bundle_no, sorters)))
 
-    for col, vals in filters.items():
+    for name, vals in filters.items():
         if vals:
-            stmt = stmt.where(getattr(inspection_result.c, col).in_(vals))
+            col = getattr(inspection_result.c, name, None)
+            if col is None:
+                raise HTTPException(400, f"필터 컬럼 없음: {name}")
+            stmt = stmt.where(col.in_(coerce_values(col, vals)))
 
     if mode in ["unit", "underkill", "overkill"]:
         stmt = stmt.order_by(
@@ -170,46 +235,127 @@ def get_detail_data(test_id: int, payload: dict = Body(...), db: Session = Depen
             )
         )
 
-    if sort and sort.get("field"):
-        field = sort.get("field")
-        direction = sort.get("direction", "asc")
-        sort_column = getattr(inspection_result.c, field, None)
+    if sort_field:
+        sort_column = cast(safe_float(getattr(inspection_result.c, sort_field)), Float)
+        stmt = stmt.add_columns(sort_column.label("sort_value")).where(sort_column != -1)
 
-        if sort_column is not None:
+    return stmt.subquery()
 
-            sort_column =  cast(safe_float(getattr(inspection_result.c, field)), Float)
- 
-            stmt = stmt.where(sort_column != -1)
+@router.post("/{test_id}/data")
+async def get_detail_data(test_id: int, payload: dict = Body(...)):
 
-            stmt = stmt.order_by(
-                sort_column.desc() if direction == "desc" else sort_column.asc()
-            )
+    mode = payload.get("mode", "point")
+    page = payload.get("page", 1)
+    size = payload.get("size", 100)
+    filters = payload.get("filters", {})
+    sort = payload.get("sort")
+    sorters = payload.get("sorters", [])
+    cursor = payload.get("cursor")
+    fmt = payload.get("format", "rows")
+
+    if fmt not in ("rows", "columnar"):
+        raise HTTPException(400, "format 은 rows 또는 columnar")
 
+    sort_field = None
+    direction = "asc"
+    if sort and sort.get("field") and getattr(inspection_result.c, sort.get("field"), None) is not None:
+        sort_field = sort.get("field")
+        direction = sort.get("direction", "asc")
 
-    total = db.scalar(select(func.count()).select_from(stmt.subquery()))
+    sub = build_detail_stmt(test_id, mode, filters, sorters, sort_field)
 
-    stmt = stmt.limit(size).offset((page - 1) * size)
-    rows = db.execute(stmt).fetchall()
+    total_key = (
+        test_id, mode, json.dumps(filters, sort_keys=True, default=str),
+        tuple(sorters), sort_field,
+    )
+    total = detail_totals.get(total_key)
 
-    visible = {
-        "strip_id","defect_code","afvi_ai_keyin","afvi_ai_defect","afvi_false_defect",
-        "afvi_clf_defect","afvi_ai_longest","afvi_ai_gv",
-        "ivs_keyin1","image_path"
-    }
+    # Sort value first, then the unit/point identity so every row has a stable position.
+    key_cols = [
+        sub.c.strip_id, sub.c.bundle_no, sub.c.n_unit_x, sub.c.n_unit_y, sub.c.body_id
+    ]
+    if sort_field:
+        key_cols.insert(0, sub.c.sort_value)
+
+    desc = direction == "desc"
+    cursor_key = (*total_key, desc)
+    stmt = select(sub).order_by(*keyset_order(key_cols, desc))
+
+    if cursor is not None:
+        if cursor:
+            after = decode_cursor(cursor, key_cols, cursor_key)
+            stmt = stmt.where(keyset_after(key_cols, after, desc))
+        stmt = stmt.limit(size + 1)
+    else:
+        stmt = stmt.limit(size).offset((page - 1) * size)
+
+    # The page and (uncached) total run concurrently on separate connections.
+    if total is None:
+        rows, (total,) = await asyncio.gather(
+            fetch_all(stmt), fetch_one(select(func.count()).select_from(sub))
+        )
+        detail_totals.set(total_key, total)
+    else:
+        rows = await fetch_all(stmt)
 
-    cleaned = [{k: v for k, v in r._mapping.items() if k in visible} for r in rows]
+    if cursor is not None:
+        has_more = len(rows) > size
+        rows = rows[:size]
+    else:
+        has_more = (page * size) < total
 
-    return {
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor([rows[-1]._mapping[c.name] for c in key_cols], cursor_key)
+
+    result = {
         "mode": mode,
         "page": page,
         "pageSize": size,
         "total": total,
-        "hasMore": (page * size) < total,
-        "rows": cleaned
+        "hasMore": has_more,
+        "cursor": next_cursor,
     }
 
+    if fmt == "columnar":
+        result.update(columnar_rows(rows))
+    else:
+        result["rows"] = visible_rows(rows)
+
+    return FastJSONResponse(result)
+
 @router.get("/{test_id}/summary")
-def get_single_summary(test_id: int, sorters: str | None = None, db: Session = Depends(get_db)):
+async def get_single_summary(test_id: int, sorters: str | None = None):
     sorter_values = sorters.split(",") if sorters else None
-    return build_summary_from_sql(db, test_id, sorter_values)
+    return await load_detail_summary_async(test_id, sorter_values)
+
+
+heatmap_cache = LRUCache(maxsize=256, ttl=600)
+
+def split_param(value):
+    return sorted(value.split(",")) if value else None
+
+@router.get("/{test_id}/heatmap")
+async def get_heatmap(
+    test_id: int,
+    norm: str | None = None,
+    defect: str | None = None,
+    sorters: str | None = None,
+    bins: int = HEATMAP_BINS,
+):
+    if not 1 <= bins <= MAX_HEATMAP_BINS:
+        raise HTTPException(400, f"bins 는 1~{MAX_HEATMAP_BINS}")
+
+    filters = {
+        "norms": split_param(norm),
+        "defects": split_param(defect),
+        "sorters": split_param(sorters),
+    }
+    key = (test_id, bins, *(tuple(v) if v else None for v in filters.values()))
+
+    result = heatmap_cache.get(key)
+    if result is None:
+        result = await load_heatmap(test_id, bins, **filters)
+        heatmap_cache.set(key, result)
 
+    return FastJSONResponse(result)
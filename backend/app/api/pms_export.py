@@ -0,0 +1,106 @@
+import os
+
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.service.export_jobs import submit_export_job, read_status, artifact_path
+from app.service.xlsx_stream import XLSX_MEDIA_TYPE
+from app.service.http_range import parse_range
+
+router = APIRouter(prefix="/api/pms/export-jobs", tags=["PMS Export Jobs"])
+
+CHUNK = 1024 * 1024
+
+
+def iter_file_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+PAYLOAD_FIELDS = {
+    "testList": list,
+    "excelOptions": dict,
+}
+
+TEST_FIELDS = ("id", "lot", "version")
+
+
+def payload_field(payload, name):
+    if name not in payload:
+        raise HTTPException(422, f"{name} 필드 누락")
+    value = payload[name]
+    if not isinstance(value, PAYLOAD_FIELDS[name]):
+        raise HTTPException(422, f"{name} 필드 형식 오류")
+    return value
+
+
+@router.post("")
+async def submit_job(request: Request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(400, "JSON 형식 오류")
+    if not isinstance(payload, dict):
+        raise HTTPException(422, "요청 본문은 JSON 객체")
+
+    test_list = payload_field(payload, "testList")
+    excel_options = payload_field(payload, "excelOptions")
+    for i, test in enumerate(test_list):
+        if not isinstance(test, dict):
+            raise HTTPException(422, f"testList[{i}] 형식 오류")
+        missing = [f for f in TEST_FIELDS if f not in test]
+        if missing:
+            raise HTTPException(422, f"testList[{i}].{missing[0]} 필드 누락")
+
+    return submit_export_job(test_list, excel_options)
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    status = read_status(job_id)
+    if status is None:
+        raise HTTPException(404, "Export job 없음.")
+    return status
+
+
+@router.get("/{job_id}/download")
+def download_job(job_id: str, request: Request):
+    status = read_status(job_id)
+    if status is None:
+        raise HTTPException(404, "Export job 없음.")
+    if status["state"] != "done":
+        raise HTTPException(409, f"Export job 상태: {status['state']}")
+
+    path = artifact_path(status)
+    size = os.path.getsize(path)
+
+    media_type = "application/zip" if path.endswith(".zip") else XLSX_MEDIA_TYPE
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{status["filename"]}"',
+    }
+
+    range_header = request.headers.get("range")
+    if not range_header:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            iter_file_range(path, 0, size - 1), media_type=media_type, headers=headers
+        )
+
+    start, end = parse_range(range_header, size)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
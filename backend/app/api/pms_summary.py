@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.service.data_service import build_multi_summary
+from fastapi import APIRouter
+from app.service.summary_store import (
+    load_multi_summaries_async,
+    refresh_stale_summaries,
+    run_store_sync,
+)
 
 router = APIRouter(prefix="/api/pms/summary", tags=["PMS Summary"])
 
 @router.post("/multi")
-def get_summary_multi(test_ids: list[int], db: Session = Depends(get_db)):
-    return {tid: build_multi_summary(db, tid) for tid in test_ids}
\ No newline at end of file
+async def get_summary_multi(test_ids: list[int]):
+    return await load_multi_summaries_async(test_ids)
+
+@router.post("/refresh")
+async def refresh_summary(test_ids: list[int]):
+    stale = await run_store_sync(refresh_stale_summaries, test_ids)
+    return {"refreshed": stale}
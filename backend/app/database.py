@@ -1,29 +1,42 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import OperationalError
+import os
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-DB_USER = "postgres"
-DB_PASS = "1121"
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "postgres"
+DB_USER = os.getenv("PMS_DB_USER", "postgres")
+DB_PASS = os.getenv("PMS_DB_PASS", "1121")
+DB_HOST = os.getenv("PMS_DB_HOST", "localhost")
+DB_PORT = int(os.getenv("PMS_DB_PORT", 5432))
+DB_NAME = os.getenv("PMS_DB_NAME", "postgres")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
-
+DB_POOL_SIZE = int(os.getenv("PMS_DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("PMS_DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("PMS_DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("PMS_DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("PMS_DB_POOL_PRE_PING", "1") == "1"
 
-try:
-    with engine.connect() as conn:
+# statement_timeout (ms) per endpoint class; 0 disables it.
+STATEMENT_TIMEOUTS = {
+    "lookup": int(os.getenv("PMS_DB_LOOKUP_TIMEOUT_MS", 5000)),
+    "query": int(os.getenv("PMS_DB_QUERY_TIMEOUT_MS", 30000)),
+}
 
-        SessionLocal  = sessionmaker(autocommit = False, autoflush= False, bind=engine)
-        # result = conn.execute(text("SELECT version();"))
-        # version = result.fetchone()
-        # print(f"PostgreSQL 연결 성공! 버전: {version[0]}")
+# No connection is made here; the pool connects on first checkout.
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
 
-      
-except OperationalError as e:
-    print(f" PostgreSQL 연결 실패: {e}")
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
     db = SessionLocal()
@@ -31,4 +44,73 @@ def get_db():
         yield db
     finally:
         db.close()
-        
+
+def statement_timeout(timeout_ms):
+    # set_config(..., true) is SET LOCAL: it ends with the transaction.
+    return select(func.set_config("statement_timeout", str(timeout_ms), True))
+
+def read_only_db(kind="query"):
+    # Plain Core connection for select-only endpoints: read-only transaction
+    # with a statement_timeout, both reset when the connection is returned.
+    timeout_ms = STATEMENT_TIMEOUTS[kind]
+
+    def dependency():
+        with engine.connect().execution_options(postgresql_readonly=True) as conn:
+            conn.execute(statement_timeout(timeout_ms))
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+
+    return dependency
+
+get_lookup_db = read_only_db("lookup")
+get_query_db = read_only_db("query")
+
+_async_engine = None
+
+def get_async_engine():
+    # Created on first use so that importing this module never needs asyncpg
+    # or a database; it shares the pool settings of the sync engine.
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    return _async_engine
+
+def async_session():
+    return AsyncSession(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+@asynccontextmanager
+async def read_only_async_connection(kind="query"):
+    async with get_async_engine().connect() as conn:
+        conn = await conn.execution_options(postgresql_readonly=True)
+        await conn.execute(statement_timeout(STATEMENT_TIMEOUTS[kind]))
+        try:
+            yield conn
+        finally:
+            await conn.rollback()
+
+async def fetch_all(stmt, kind="query"):
+    # One pooled connection per call, so independent queries can be gathered.
+    async with read_only_async_connection(kind) as conn:
+        return (await conn.execute(stmt)).fetchall()
+
+async def fetch_one(stmt, kind="query"):
+    async with read_only_async_connection(kind) as conn:
+        return (await conn.execute(stmt)).one()
+
+def read_only_async_db(kind="query"):
+    async def dependency():
+        async with read_only_async_connection(kind) as conn:
+            yield conn
+
+    return dependency
+
+get_async_query_db = read_only_async_db("query")
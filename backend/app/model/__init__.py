@@ -1 +1,2 @@
-from .inspection_result import inspection_result
\ No newline at end of file
+from .inspection_result import inspection_result
+from .summary_store import summary_info, summary_counts
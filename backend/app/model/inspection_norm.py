@@ -0,0 +1,131 @@
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import select, func
+from app.database import engine
+from .inspection_result import inspection_result_raw, NORM_VIEW_NAME, USE_NORM_VIEW
+from .norm_result import normalized_result_expr, priority_expr
+from .search_keys import itemcode_expr, lot_key_expr
+
+SCHEMA = "pms_schema"
+
+# PMS_NORM_VIEW_REFRESH_S > 0 refreshes the view from the API process on that
+# interval (one worker at a time, via REFRESH_LOCK_ID); otherwise schedule
+# `python -m app.model.inspection_norm refresh` after each import instead.
+# Either way the stored summaries are re-checked right after a refresh.
+REFRESH_INTERVAL = int(os.getenv("PMS_NORM_VIEW_REFRESH_S", 0))
+REFRESH_LOCK_ID = 0x504D5356  # "PMSV"
+
+# REFRESH ... CONCURRENTLY needs a unique index over plain columns covering
+# every row. body_id repeats within a test, so row_no numbers the copies.
+UNIQUE_INDEX = ("ix_mv_inspection_result_row", "(test_id, body_id, row_no)")
+
+INDEXES = {
+    "ix_mv_inspection_result_unit":
+        "(test_id, strip_id, bundle_no, n_unit_x, n_unit_y, priority)",
+    "ix_mv_inspection_result_test_norm":
+        "(test_id, norm_result)",
+    # Cascading filter dropdowns: machine -> item -> lot -> sorter.
+    "ix_mv_inspection_result_machine_item":
+        "(inspection_machine, itemcode)",
+    "ix_mv_inspection_result_item_lot":
+        "(itemcode, lot_no)",
+    "ix_mv_inspection_result_lot_key_bundle":
+        "(lot_key, bundle_no)",
+    # Free-text ILIKE '%...%' search.
+    "ix_mv_inspection_result_itemcode_trgm":
+        "USING gin (itemcode gin_trgm_ops)",
+    "ix_mv_inspection_result_lot_no_trgm":
+        "USING gin (lot_no gin_trgm_ops)",
+}
+
+
+def norm_view_select():
+    raw = inspection_result_raw
+    norm = normalized_result_expr(raw.c.afvi_ai_keyin)
+
+    return (
+        select(
+            raw,
+            norm.label("norm_result"),
+            priority_expr(norm).label("priority"),
+            itemcode_expr(raw.c.file_name).label("itemcode"),
+            lot_key_expr(raw.c.lot_no).label("lot_key"),
+            func.row_number().over(
+                partition_by=(raw.c.test_id, raw.c.body_id),
+                order_by=(raw.c.strip_id, raw.c.ai_date_time),
+            ).label("row_no"),
+        )
+        .where(raw.c.inspection_machine.like("M__V%"))
+    )
+
+
+def create_norm_view(bind=engine):
+    body = norm_view_select().compile(
+        dialect=bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    with bind.begin() as conn:
+        conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        conn.exec_driver_sql(
+            f"CREATE MATERIALIZED VIEW IF NOT EXISTS {SCHEMA}.{NORM_VIEW_NAME} AS {body}"
+        )
+        conn.exec_driver_sql(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX[0]} "
+            f"ON {SCHEMA}.{NORM_VIEW_NAME} {UNIQUE_INDEX[1]}"
+        )
+        for name, cols in INDEXES.items():
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {SCHEMA}.{NORM_VIEW_NAME} {cols}"
+            )
+
+
+def refresh_norm_view(bind=engine):
+    # CONCURRENTLY keeps the view readable while it is rebuilt; the advisory
+    # lock skips the refresh when another process is already running one.
+    with bind.begin() as conn:
+        if not conn.scalar(select(func.pg_try_advisory_xact_lock(REFRESH_LOCK_ID))):
+            return False
+        conn.exec_driver_sql(
+            f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SCHEMA}.{NORM_VIEW_NAME}"
+        )
+    return True
+
+
+def refresh_loop(on_refresh=None):
+    while True:
+        time.sleep(REFRESH_INTERVAL)
+        try:
+            if refresh_norm_view() and on_refresh:
+                on_refresh()
+        except Exception as e:
+            print(f"[WARNING] {NORM_VIEW_NAME} refresh failed: {e}")
+
+
+def start_norm_view_refresh(on_refresh=None):
+    if USE_NORM_VIEW and REFRESH_INTERVAL > 0:
+        threading.Thread(
+            target=refresh_loop, args=(on_refresh,), daemon=True, name="norm-view-refresh"
+        ).start()
+
+
+def drop_norm_view(bind=engine):
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"DROP MATERIALIZED VIEW IF EXISTS {SCHEMA}.{NORM_VIEW_NAME}")
+
+
+if __name__ == "__main__":
+    # python -m app.model.inspection_norm [create|refresh|rebuild]
+    command = sys.argv[1] if len(sys.argv) > 1 else "create"
+
+    if command == "rebuild":
+        drop_norm_view()
+        create_norm_view()
+    elif command == "refresh":
+        if refresh_norm_view():
+            from app.service.summary_store import invalidate_stale_summaries
+            invalidate_stale_summaries()
+    else:
+        create_norm_view()
@@ -1,48 +1,62 @@
-from sqlalchemy import MetaData, Table
-from app.database import engine
+import os
+from sqlalchemy import MetaData
 from sqlalchemy import select
+from .schema_cache import load_table
 
 metadata = MetaData()
 
-inspection_result_raw = Table(
-    "v_inspection_result",
-    metadata,
-    autoload_with=engine,
-    schema="pms_schema"
-)
+NORM_VIEW_NAME = "mv_inspection_result"
+
+# Columns the materialized view adds on top of v_inspection_result.
+DERIVED_COLUMNS = ("norm_result", "priority", "itemcode", "lot_key")
+
+# PMS_NORM_VIEW=1 reads from the materialized view built by app.model.inspection_norm.
+USE_NORM_VIEW = os.getenv("PMS_NORM_VIEW", "0") == "1"
+
+# Column metadata comes from the local schema cache, so importing this
+# module needs no database round-trip once the cache exists.
+inspection_result_raw = load_table("v_inspection_result", metadata, schema="pms_schema")
+
+inspection_result_source = load_table(
+    NORM_VIEW_NAME, metadata, schema="pms_schema"
+) if USE_NORM_VIEW else inspection_result_raw
 
 
 
 inspection_result = (
     select(
-        inspection_result_raw.c.strip_id,
-        inspection_result_raw.c.test_id,
-        inspection_result_raw.c.ai_date_time,
-        inspection_result_raw.c.core_version,
-        inspection_result_raw.c.rms_customer,
-        inspection_result_raw.c.file_name,
-        inspection_result_raw.c.inspection_machine,
-        inspection_result_raw.c.lot_no,
-        inspection_result_raw.c.body_id,
-        inspection_result_raw.c.n_unit_x,
-        inspection_result_raw.c.n_unit_y,
-        inspection_result_raw.c.rel_x_unit,
-        inspection_result_raw.c.rel_y_unit,
-        inspection_result_raw.c.defect_height,
-        inspection_result_raw.c.defect_width,
-        inspection_result_raw.c.skip_data,
-        inspection_result_raw.c.bundle_no,
-        inspection_result_raw.c.defect_code,
-        inspection_result_raw.c.afvi_ai_keyin,
-        inspection_result_raw.c.afvi_ai_defect,
-        inspection_result_raw.c.afvi_ai_longest,
-        inspection_result_raw.c.afvi_ai_gv,         
-        inspection_result_raw.c.afvi_clf_defect,
-        inspection_result_raw.c.afvi_clf_score,
-        inspection_result_raw.c.afvi_false_defect,
-        inspection_result_raw.c.afvi_false_score,
-        inspection_result_raw.c.ivs_keyin1,
-        inspection_result_raw.c.image_path,
+        inspection_result_source.c.strip_id,
+        inspection_result_source.c.test_id,
+        inspection_result_source.c.ai_date_time,
+        inspection_result_source.c.core_version,
+        inspection_result_source.c.rms_customer,
+        inspection_result_source.c.file_name,
+        inspection_result_source.c.inspection_machine,
+        inspection_result_source.c.lot_no,
+        inspection_result_source.c.body_id,
+        inspection_result_source.c.n_unit_x,
+        inspection_result_source.c.n_unit_y,
+        inspection_result_source.c.rel_x_unit,
+        inspection_result_source.c.rel_y_unit,
+        inspection_result_source.c.defect_height,
+        inspection_result_source.c.defect_width,
+        inspection_result_source.c.skip_data,
+        inspection_result_source.c.bundle_no,
+        inspection_result_source.c.defect_code,
+        inspection_result_source.c.afvi_ai_keyin,
+        inspection_result_source.c.afvi_ai_defect,
+        inspection_result_source.c.afvi_ai_longest,
+        inspection_result_source.c.afvi_ai_gv,         
+        inspection_result_source.c.afvi_clf_defect,
+        inspection_result_source.c.afvi_clf_score,
+        inspection_result_source.c.afvi_false_defect,
+        inspection_result_source.c.afvi_false_score,
+        inspection_result_source.c.ivs_keyin1,
+        inspection_result_source.c.image_path,
+        *(
+            [inspection_result_source.c[name] for name in DERIVED_COLUMNS]
+            if USE_NORM_VIEW else []
+        ),
     )
-    .where(inspection_result_raw.c.inspection_machine.like("M__V%"))
+    .where(inspection_result_source.c.inspection_machine.like("M__V%"))
 ).subquery()
\ No newline at end of file
@@ -0,0 +1,34 @@
+from sqlalchemy import case
+
+OK_MARK = "AI_OK"
+
+NG_KEYINS = [
+    "AI_UNKNOWN_NG1",
+    "AI_UNKNOWN_NG1_LOGIT",
+    "AI_NG_NG1",
+    "AI_NG_NG1_LOGIT",
+    "AI_NG_NG1_UNDERCUT"
+]
+
+ICS_KEYIN = "AI_ICS_Recheck"
+
+UNKNOWN_PREFIX = "AI_UNKNOWN"
+
+
+def normalized_result_expr(keyin):
+    return case(
+        (keyin.ilike(f"%{OK_MARK}%"), "OK"),
+        (keyin.in_(NG_KEYINS), "NG"),
+        (keyin == ICS_KEYIN, "ICS_Recheck"),
+        (keyin.ilike(f"{UNKNOWN_PREFIX}%"), "UNKNOWN"),
+        else_=keyin
+    )
+
+
+def priority_expr(norm):
+    return case(
+        (norm == "NG", 1),
+        (norm == "ICS_Recheck", 2),
+        (norm == "UNKNOWN", 3),
+        else_=4
+    )
@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy import types as sqltypes
+from sqlalchemy.dialects import postgresql
+
+from app.database import engine
+
+# Kept outside the package so a read-only install or a redeploy does not
+# fight with it; same default location as the export job files.
+SCHEMA_CACHE_PATH = os.getenv(
+    "PMS_SCHEMA_CACHE", os.path.join(tempfile.gettempdir(), "pms_schema_cache.json")
+)
+
+# PMS_SCHEMA_VERIFY=1 re-reflects in the background after startup and
+# rewrites the cache when the catalog has drifted.
+VERIFY_SCHEMA = os.getenv("PMS_SCHEMA_VERIFY", "0") == "1"
+
+TYPE_ARGS = ("length", "precision", "scale", "timezone")
+
+_cached_tables = {}
+
+
+def type_to_json(col_type):
+    data = {"type": type(col_type).__name__}
+    for arg in TYPE_ARGS:
+        value = getattr(col_type, arg, None)
+        if value is not None:
+            data[arg] = value
+    return data
+
+
+def type_from_json(data):
+    cls = getattr(postgresql, data["type"], None) or getattr(sqltypes, data["type"], None)
+    if cls is None:
+        return sqltypes.NullType()
+
+    kwargs = {arg: data[arg] for arg in TYPE_ARGS if arg in data}
+    try:
+        return cls(**kwargs)
+    except TypeError:
+        pass
+    try:
+        return cls()
+    except TypeError:
+        # e.g. ARRAY, which needs its item type.
+        return sqltypes.NullType()
+
+
+def table_to_json(table):
+    return [
+        {"name": c.name, "nullable": c.nullable, **type_to_json(c.type)}
+        for c in table.columns
+    ]
+
+
+def cache_key(schema, name):
+    return f"{schema}.{name}"
+
+
+def read_schema_cache():
+    try:
+        with open(SCHEMA_CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_schema_cache(tables):
+    # Workers starting together each write through their own temp file;
+    # os.replace keeps whichever lands last, and readers never see a partial file.
+    folder = os.path.dirname(os.path.abspath(SCHEMA_CACHE_PATH))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".schema_cache.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(tables, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, SCHEMA_CACHE_PATH)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def reflect_columns(name, schema, bind=engine):
+    return table_to_json(Table(name, MetaData(), autoload_with=bind, schema=schema))
+
+
+def load_table(name, metadata, schema):
+    # Builds the Table from the cached catalog; only a missing entry costs a
+    # live reflection (which then seeds the cache for the next start).
+    cache = read_schema_cache()
+    key = cache_key(schema, name)
+
+    if key not in cache:
+        cache[key] = reflect_columns(name, schema)
+        write_schema_cache(cache)
+
+    _cached_tables[key] = (name, schema, cache[key])
+
+    return Table(
+        name,
+        metadata,
+        *(
+            Column(c["name"], type_from_json(c), nullable=c["nullable"])
+            for c in cache[key]
+        ),
+        schema=schema,
+    )
+
+
+def verify_schema_cache(bind=engine):
+    # Returns the tables whose cached columns no longer match the catalog.
+    cache = read_schema_cache()
+    drifted = []
+    for key, (name, schema, cached) in list(_cached_tables.items()):
+        current = reflect_columns(name, schema, bind)
+        if current != cached:
+            cache[key] = current
+            drifted.append(key)
+
+    if drifted:
+        write_schema_cache(cache)
+        print(f"[WARNING] Schema cache refreshed for {drifted}; restart workers to apply.")
+
+    return drifted
+
+
+def verify_in_background():
+    try:
+        verify_schema_cache()
+    except Exception as e:
+        print(f"[WARNING] Schema cache verification failed: {e}")
+
+
+def start_schema_verification():
+    if VERIFY_SCHEMA:
+        threading.Thread(target=verify_in_background, daemon=True, name="schema-verify").start()
+
+
+if __name__ == "__main__":
+    # python -m app.model.schema_cache refresh
+    if sys.argv[1:] != ["refresh"]:
+        sys.exit("usage: python -m app.model.schema_cache refresh")
+
+    # Importing the models registers their tables with the package module,
+    # not with this __main__ copy.
+    import app.model  # noqa: F401
+    from app.model.schema_cache import verify_schema_cache as verify
+
+    print(verify() or "schema cache up to date")
@@ -0,0 +1,10 @@
+from sqlalchemy import func
+
+
+def itemcode_expr(file_name):
+    # ".../<itemcode>_<rest>" -> "<itemcode>"
+    return func.split_part(func.split_part(file_name, "/", -1), "_", 1)
+
+
+def lot_key_expr(lot_no):
+    return func.trim(func.upper(lot_no))
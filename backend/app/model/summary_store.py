@@ -0,0 +1,36 @@
+from sqlalchemy import MetaData, Table, Column, Index, BigInteger, Text
+from .inspection_result import inspection_result_raw
+
+metadata = MetaData()
+
+raw = inspection_result_raw.c
+
+summary_info = Table(
+    "pms_summary_info",
+    metadata,
+    Column("test_id", raw.test_id.type, primary_key=True),
+    Column("lot_no", raw.lot_no.type),
+    Column("inspection_machine", raw.inspection_machine.type),
+    Column("rms_customer", raw.rms_customer.type),
+    Column("core_version", raw.core_version.type),
+    Column("ai_date_time", raw.ai_date_time.type),
+    Column("itemcode", Text),
+    Column("source_dt", raw.ai_date_time.type),
+    schema="pms_schema"
+)
+
+summary_counts = Table(
+    "pms_summary_counts",
+    metadata,
+    Column("test_id", raw.test_id.type, nullable=False),
+    Column("bundle_no", raw.bundle_no.type),
+    Column("afvi_ai_keyin", raw.afvi_ai_keyin.type),
+    Column("afvi_ai_defect", raw.afvi_ai_defect.type),
+    Column("norm_result", Text),
+    Column("point_cnt", BigInteger, nullable=False),
+    Column("unit_cnt", BigInteger, nullable=False),
+    Column("underk_cnt", BigInteger, nullable=False),
+    Column("overk_cnt", BigInteger, nullable=False),
+    Index("ix_pms_summary_counts_test_bundle", "test_id", "bundle_no"),
+    schema="pms_schema"
+)
@@ -0,0 +1,89 @@
+import mmap
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+BI_RGB = 0
+
+CORE_HEADER_SIZE = 12
+
+# Fixed-point weights cv2's bmp decoder uses for IMREAD_GRAYSCALE, so region
+# crops match full-decode crops exactly.
+GRAY_WEIGHTS = np.array([1868, 9617, 4899], dtype=np.uint32)
+
+
+def bgr_to_gray(bgr):
+    return ((bgr[..., :3].astype(np.uint32) @ GRAY_WEIGHTS + (1 << 13)) >> 14).astype(np.uint8)
+
+
+def parse_bmp_header(buf):
+    # Returns None for anything the region reader can't slice directly
+    # (RLE/bitfield compression, 1/4/16-bit pixels): callers fall back to cv2.
+    if buf[:2] != b"BM":
+        return None
+
+    offset = struct.unpack_from("<I", buf, 10)[0]
+    dib_size = struct.unpack_from("<I", buf, 14)[0]
+
+    if dib_size == CORE_HEADER_SIZE:
+        width, height, _, bpp = struct.unpack_from("<HHHH", buf, 18)
+        compression, colors_used, entry_size = BI_RGB, 0, 3
+    else:
+        width, height, _, bpp, compression = struct.unpack_from("<iiHHI", buf, 18)
+        colors_used = struct.unpack_from("<I", buf, 46)[0]
+        entry_size = 4
+
+    if compression != BI_RGB or bpp not in (8, 24, 32) or width <= 0 or height == 0:
+        return None
+
+    palette = None
+    if bpp == 8:
+        count = colors_used or 256
+        start = 14 + dib_size
+        entries = np.frombuffer(buf, dtype=np.uint8, count=count * entry_size, offset=start)
+        gray = bgr_to_gray(entries.reshape(count, entry_size))
+        palette = np.zeros(256, dtype=np.uint8)
+        palette[:count] = gray[:256]
+
+    return {
+        "offset": offset,
+        "width": width,
+        "height": abs(height),
+        "bottom_up": height > 0,
+        "bpp": bpp,
+        "stride": (width * bpp + 31) // 32 * 4,
+        "palette": palette,
+    }
+
+
+@contextmanager
+def open_bmp(path):
+    # Yields (mm, header); header is None when the file can't be sliced.
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield mm, parse_bmp_header(mm)
+
+
+def read_region(mm, header, x1, y1, x2, y2):
+    # Grayscale pixels of [y1:y2, x1:x2] (already clipped to the image),
+    # copied out of the memory map so only the covered rows are read.
+    height, stride = header["height"], header["stride"]
+    channels = header["bpp"] // 8
+    rows = y2 - y1
+
+    first_row = height - y2 if header["bottom_up"] else y1
+
+    pixels = np.frombuffer(
+        mm, dtype=np.uint8, count=rows * stride, offset=header["offset"] + first_row * stride
+    ).reshape(rows, stride)
+    region = pixels[:, x1 * channels:x2 * channels].copy()
+    del pixels
+
+    if header["bottom_up"]:
+        region = region[::-1]
+
+    if channels == 1:
+        return header["palette"][region]
+
+    return bgr_to_gray(region.reshape(rows, x2 - x1, channels))
+
@@ -0,0 +1,33 @@
+import datetime
+from decimal import Decimal
+
+from fastapi import HTTPException
+
+# Request values arrive as JSON/query strings; asyncpg binds strictly by
+# type, so they are converted to the column's Python type before binding.
+
+
+def coerce_value(col, value):
+    if value is None:
+        return None
+    try:
+        python_type = col.type.python_type
+    except NotImplementedError:
+        return value
+
+    if isinstance(value, python_type) and not isinstance(value, bool):
+        return value
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    if python_type in (int, float, Decimal, str):
+        return python_type(value)
+    return value
+
+
+def coerce_values(col, values):
+    try:
+        return [coerce_value(col, v) for v in values]
+    except (TypeError, ValueError, ArithmeticError):
+        raise HTTPException(400, f"{col.name} 값 형식 오류")
@@ -0,0 +1,97 @@
+import datetime
+from decimal import Decimal
+from operator import itemgetter
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COLUMNAR_FORMATS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+ROW_GROUP_ROWS = 128 * 1024
+
+
+def arrow_type(sa_type):
+    try:
+        python_type = sa_type.python_type
+    except NotImplementedError:
+        return pa.string()
+
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type in (float, Decimal):
+        return pa.float64()
+    if python_type is datetime.datetime:
+        return pa.timestamp("us", tz="UTC" if getattr(sa_type, "timezone", False) else None)
+    if python_type is datetime.date:
+        return pa.date32()
+    if python_type is datetime.time:
+        return pa.time64("us")
+    return pa.string()
+
+
+def arrow_schema(stmt):
+    return pa.schema([pa.field(c.name, arrow_type(c.type)) for c in stmt.selected_columns])
+
+
+def to_float(value):
+    return None if value is None else float(value)
+
+
+def to_text(value):
+    return None if value is None else str(value)
+
+
+def record_batch(rows, schema):
+    arrays = []
+    for i, field in enumerate(schema):
+        values = list(map(itemgetter(i), rows))
+        if pa.types.is_floating(field.type):
+            values = list(map(to_float, values))
+        elif pa.types.is_string(field.type):
+            values = list(map(to_text, values))
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(path, batches, schema):
+    # zstd-compressed row groups of exactly ROW_GROUP_ROWS (the last one
+    # excepted), written as the cursor is read; the tail of each flush is
+    # carried into the next group.
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in batches:
+            if not rows:
+                continue
+            pending.append(record_batch(rows, schema))
+            pending_rows += len(rows)
+            if pending_rows < ROW_GROUP_ROWS:
+                continue
+
+            table = pa.Table.from_batches(pending, schema=schema)
+            full = pending_rows - pending_rows % ROW_GROUP_ROWS
+            writer.write_table(table.slice(0, full), row_group_size=ROW_GROUP_ROWS)
+            tail = table.slice(full)
+            pending, pending_rows = tail.to_batches(), tail.num_rows
+
+        if pending_rows:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=ROW_GROUP_ROWS)
+
+
+def write_arrow(path, batches, schema):
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for rows in batches:
+            if rows:
+                writer.write_batch(record_batch(rows, schema))
+
+
+def write_columnar(path, batches, schema, fmt):
+    if fmt == "parquet":
+        write_parquet(path, batches, schema)
+    else:
+        write_arrow(path, batches, schema)
+    return path
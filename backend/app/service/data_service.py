@@ -1,8 +1,13 @@
-from sqlalchemy import case, cast,select, func, Float, FLOAT, REAL, INTEGER, NUMERIC
+from sqlalchemy import case, cast,select, func, exists, Float, FLOAT, REAL, INTEGER, NUMERIC
 from app.model import inspection_result
-from .query_build import NORMALIZED_RESULT, PRIORITY
+from app.model.inspection_result import DERIVED_COLUMNS
+from app.model.norm_result import OK_MARK, NG_KEYINS, ICS_KEYIN, UNKNOWN_PREFIX
+from .query_build import NORMALIZED_RESULT, PRIORITY, ITEMCODE
 from collections import Counter
+from itertools import groupby
+from operator import attrgetter, itemgetter
 import re
+import numpy as np
 
 def safe_float(col):
 
@@ -33,8 +38,7 @@ def percent(num, total):
         return "0%"
     return f"{(num / total) * 100:.2f}%"
 
-def count_by(rows, key):
-    counter = Counter((get_value(r, key, "UNKNOWN") or "UNKNOWN") for r in rows)
+def ranked(counter):
     return sorted(
         [{"value": v, "count": c} for v, c in counter.items()],
         key=lambda x: x["count"],
@@ -47,38 +51,42 @@ def add_rate(list_, total):
     return [{**item, "rate": percent(item["count"], total)} for item in list_]
 
 
-def distribution(rows):
-    total = len(rows)
+def distribution(count_rows):
+    defect_counter = Counter()
+    unk_defect_counter = Counter()
+    ng_defect_counter = Counter()
+    unk_keyin_counter = Counter()
+    unk_detail_counter = {}
 
-    defectTop10 = add_rate(count_by(rows, "afvi_ai_defect"), total)[:10]
+    for r in count_rows:
+        keyin = r.afvi_ai_keyin or ""
+        defect = r.afvi_ai_defect or "UNKNOWN"
+        n = r.point_cnt
 
-    unk_rows = [
-        r for r in rows
-        if "AI_UNKNOWN" in (get_value(r, "afvi_ai_keyin") or "")
-    ]
-    unk_total = len(unk_rows)
+        defect_counter[defect] += n
 
-    unkDefectTop10 = add_rate(count_by(unk_rows, "afvi_ai_defect"), unk_total)[:10]
+        if "AI_UNKNOWN" in keyin:
+            unk_defect_counter[defect] += n
+            unk_keyin_counter[keyin] += n
+            unk_detail_counter.setdefault(keyin, Counter())[defect] += n
 
-    ng_rows = [
-        r for r in rows
-        if "AI_NG" in (get_value(r, "afvi_ai_keyin") or "")
-    ]
-    ng_total = len(ng_rows)
+        if "AI_NG" in keyin:
+            ng_defect_counter[defect] += n
 
-    ngDefectTop10 = add_rate(count_by(ng_rows, "afvi_ai_defect"), ng_total)[:10]
+    total = sum(defect_counter.values())
+    unk_total = sum(unk_defect_counter.values())
+    ng_total = sum(ng_defect_counter.values())
 
-    unkResultDistribution = add_rate(count_by(unk_rows, "afvi_ai_keyin"), unk_total)
-    unkResultDistribution = sorted(unkResultDistribution, key=lambda x: x["count"], reverse=True)
+    defectTop10 = add_rate(ranked(defect_counter), total)[:10]
+    unkDefectTop10 = add_rate(ranked(unk_defect_counter), unk_total)[:10]
+    ngDefectTop10 = add_rate(ranked(ng_defect_counter), ng_total)[:10]
+
+    unkResultDistribution = add_rate(ranked(unk_keyin_counter), unk_total)
 
     unkDetailMap = {}
     for item in unkResultDistribution:
         key = item["value"]
-        target_rows = [r for r in unk_rows if get_value(r, "afvi_ai_keyin") == key]
-
-        defect_map = count_by(target_rows, "afvi_ai_defect")
-        defect_map = add_rate(defect_map, len(target_rows))
-
+        defect_map = add_rate(ranked(unk_detail_counter[key]), item["count"])
         unkDetailMap[key] = top_n_with_others(defect_map, 9)
 
     return {
@@ -90,82 +98,91 @@ def distribution(rows):
     }
 
 
-def build_summary_from_sql(db, test_id: int, sorter_values=None):
-
-    filters = [inspection_result.c.test_id == test_id]
-    if sorter_values:
-        filters.append(inspection_result.c.bundle_no.in_(sorter_values))
-
-    point_stmt = (
-        select(NORMALIZED_RESULT, func.count())
-        .where(*filters)
-        .group_by(NORMALIZED_RESULT)
+def summary_counts_stmt(filters, *group_cols):
+    # One scan: every point is counted once, and row_number() marks the
+    # DISTINCT ON representative of its unit so unit counts come along for free.
+    unit_rank = func.row_number().over(
+        partition_by=[
+            inspection_result.c.test_id,
+            inspection_result.c.strip_id,
+            inspection_result.c.bundle_no,
+            inspection_result.c.n_unit_x,
+            inspection_result.c.n_unit_y,
+        ],
+        order_by=PRIORITY.element.asc()
     )
 
-    dis_stmt =(
+    ranked_points = (
         select(
-        inspection_result.c.afvi_ai_keyin,
-        inspection_result.c.afvi_ai_defect,
-        ).where(*filters)
+            *group_cols,
+            inspection_result.c.afvi_ai_keyin,
+            inspection_result.c.afvi_ai_defect,
+            NORMALIZED_RESULT,
+            func.trim(func.coalesce(inspection_result.c.ivs_keyin1, "")).label("ivs_keyin1"),
+            unit_rank.label("unit_rank"),
+        )
+        .where(*filters)
+        .subquery()
     )
 
-    dis_row = db.execute(dis_stmt).fetchall()
-    dist  = distribution(dis_row)
-
-
+    c = ranked_points.c
+    is_unit = c.unit_rank == 1
 
+    keys = [c[col.name] for col in group_cols] + [
+        c.afvi_ai_keyin,
+        c.afvi_ai_defect,
+        c.norm_result,
+    ]
 
-    point_data = dict(db.execute(point_stmt).fetchall())
-
-    total_point = sum(point_data.values())
-    ok = point_data.get("OK", 0)
-    ng = point_data.get("NG", 0)
-    unk = point_data.get("UNKNOWN", 0)
-    ics = point_data.get("ICS_Recheck", 0)
-
-    unit_stmt = (
+    return (
         select(
-            NORMALIZED_RESULT.label("result"),
-            inspection_result.c.ivs_keyin1,
-        )
-        .where(*filters)
-        .order_by(
-            inspection_result.c.strip_id,
-            inspection_result.c.bundle_no,
-            inspection_result.c.n_unit_x,
-            inspection_result.c.n_unit_y,
-            PRIORITY.asc()
-        )
-        .distinct(
-            inspection_result.c.strip_id,
-            inspection_result.c.bundle_no,
-            inspection_result.c.n_unit_x,
-            inspection_result.c.n_unit_y
+            *keys,
+            func.count().label("point_cnt"),
+            func.count().filter(is_unit).label("unit_cnt"),
+            func.count().filter(
+                is_unit
+                & (c.norm_result == "OK")
+                & func.lower(c.ivs_keyin1).like("s%")
+            ).label("underk_cnt"),
+            func.count().filter(
+                is_unit
+                & (c.norm_result == "NG")
+                & c.ivs_keyin1.in_(["", "Good"])
+            ).label("overk_cnt"),
         )
+        .group_by(*keys)
     )
 
-    unit_rows = db.execute(unit_stmt).fetchall()
 
-    unit_summary = {}
+def summarize_counts(count_rows):
+    point_data = Counter()
+    unit_summary = Counter()
     underkill = 0
     overkill = 0
 
-    for row in unit_rows:
-        r = row.result
-        keyin = (row.ivs_keyin1 or "").strip()
+    for r in count_rows:
+        point_data[r.norm_result] += r.point_cnt
+        unit_summary[r.norm_result] += r.unit_cnt
+        underkill += r.underk_cnt
+        overkill += r.overk_cnt
+
+    return point_data, unit_summary, underkill, overkill
+
+
+def build_summary_from_counts(count_rows):
 
-        unit_summary[r] = unit_summary.get(r, 0) + 1
+    dist = distribution(count_rows)
+    point_data, unit_summary, underkill, overkill = summarize_counts(count_rows)
 
-        if r == "OK" and keyin.lower().startswith("s"):
-            underkill += 1
-        if r == "NG" and (keyin == "" or keyin == "Good"):
-            overkill += 1
+    total_point = sum(point_data.values())
+    ok = point_data.get("OK", 0)
+    ng = point_data.get("NG", 0)
+    unk = point_data.get("UNKNOWN", 0)
 
     unit_total = sum(unit_summary.values())
     unit_ok = unit_summary.get("OK", 0)
     unit_ng = unit_summary.get("NG", 0)
     unit_unk = unit_summary.get("UNKNOWN", 0)
-    unit_ics = unit_summary.get("ICS_Recheck", 0)
 
     under_ppm = ((underkill / unit_ok) * 1_000_000) if unit_ok > 0 else 0
     
@@ -194,31 +211,31 @@ def build_summary_from_sql(db, test_id: int, sorter_values=None):
         ]
     }
 
-def build_multi_summary(db, test_id: int):
-
-    base_filter = inspection_result.c.test_id == test_id
-
-    info_stmt = select(
-        inspection_result.c.lot_no,
-        inspection_result.c.inspection_machine,
-        inspection_result.c.rms_customer,
-        inspection_result.c.core_version,
-        inspection_result.c.ai_date_time,
-        inspection_result.c.file_name
-    ).where(base_filter).limit(1)
+def summary_info_stmt(filters):
+    return (
+        select(
+            inspection_result.c.test_id,
+            inspection_result.c.lot_no,
+            inspection_result.c.inspection_machine,
+            inspection_result.c.rms_customer,
+            inspection_result.c.core_version,
+            inspection_result.c.ai_date_time,
+            ITEMCODE,
+        )
+        .where(*filters)
+        .order_by(inspection_result.c.test_id)
+        .distinct(inspection_result.c.test_id)
+    )
 
-    info = db.execute(info_stmt).fetchone()
-    if not info:
-        return None
+def group_by_test(rows):
+    grouped = {}
+    for r in rows:
+        grouped.setdefault(r.test_id, []).append(r)
+    return grouped
 
-    itemcode = (info.file_name or "").split("/")[-1].split("_")[0]
+def assemble_multi_summary(info, count_rows):
 
-    point_stmt = (
-        select(NORMALIZED_RESULT, func.count())
-        .where(base_filter)
-        .group_by(NORMALIZED_RESULT)
-    )
-    point_data = dict(db.execute(point_stmt).fetchall())
+    point_data, unit_summary, underkill, overkill = summarize_counts(count_rows)
 
     total_point = sum(point_data.values())
     ok = point_data.get("OK", 0)
@@ -226,44 +243,9 @@ def build_multi_summary(db, test_id: int):
     unk = point_data.get("UNKNOWN", 0)
     ics = point_data.get("ICS_Recheck", 0)
 
-    unit_stmt = (
-        select(
-            NORMALIZED_RESULT.label("result"),
-            inspection_result.c.ivs_keyin1
-        )
-        .where(base_filter)
-        .order_by(
-            inspection_result.c.strip_id,
-            inspection_result.c.bundle_no,
-            inspection_result.c.n_unit_x,
-            inspection_result.c.n_unit_y,
-            PRIORITY.asc()
-        )
-        .distinct(
-            inspection_result.c.strip_id,
-            inspection_result.c.bundle_no,
-            inspection_result.c.n_unit_x,
-            inspection_result.c.n_unit_y
-        )
-    )
-    unit_rows = db.execute(unit_stmt).fetchall()
-
-    unit_count = {"OK": 0, "NG": 0, "UNKNOWN": 0, "ICS_Recheck": 0}
-    underkill = 0
-    overkill = 0
-
-    for r in unit_rows:
-        result = r.result
-        keyin = (r.ivs_keyin1 or "").strip()
-
-        if result in unit_count:
-            unit_count[result] += 1
-
-        if result == "OK" and keyin.lower().startswith("s"):
-            underkill += 1
-
-        if result == "NG" and (keyin == "" or keyin == "Good"):
-            overkill += 1
+    unit_count = {
+        k: unit_summary.get(k, 0) for k in ("OK", "NG", "UNKNOWN", "ICS_Recheck")
+    }
 
     unit_total = sum(unit_count.values())
 
@@ -274,7 +256,7 @@ def build_multi_summary(db, test_id: int):
         "lot": info.lot_no,
         "machine": info.inspection_machine,
         "customer": info.rms_customer,
-        "itemcode": itemcode,
+        "itemcode": info.itemcode,
         "version": info.core_version,
         "ai_date_time": info.ai_date_time,
 
@@ -307,12 +289,6 @@ def build_multi_summary(db, test_id: int):
 
 def load_detail_header(db, test_id):
 
-    itemcode_expr = func.split_part(
-        func.split_part(inspection_result.c.file_name, '/', -1),
-        '_',
-        1
-    ).label("itemcode")
-
     stmt = (
         select(
             inspection_result.c.test_id,
@@ -321,7 +297,7 @@ def load_detail_header(db, test_id):
             inspection_result.c.rms_customer,
             inspection_result.c.core_version,
             inspection_result.c.ai_date_time,
-            itemcode_expr,
+            ITEMCODE,
         )
         .where(inspection_result.c.test_id == test_id)
         .order_by(inspection_result.c.ai_date_time.desc())
@@ -343,93 +319,159 @@ def load_detail_header(db, test_id):
     }
 
 
-def load_lot_rows_all(db, test_ids):
-    if isinstance(test_ids, int):
-        test_ids = [test_ids]
+LOT_STREAM_BATCH = 5000
 
-    itemcode_expr = func.split_part(
-        func.split_part(inspection_result.c.file_name, '/', -1),
-        '_',
-        1
-    ).label("itemcode")
-
-    stmt = select(
-        inspection_result,      
-        itemcode_expr 
-    ).distinct(
-        inspection_result.c.body_id           
-    ).where(
-        inspection_result.c.test_id.in_(test_ids)
-    )
-
-    rows = db.execute(stmt).fetchall()
-
-    grouped = {}
-    for r in rows:
-        grouped.setdefault(r.test_id, []).append(r)
-
-    return grouped
-
-def build_unit_groups(rows):
-
-    priority_order = {
-        "NG": 1,
-        "ICS_Recheck": 2,
-        "UNKNOWN": 3,
-        "OK": 4,
-    }
-
-    groups = {}      
-    ui_map = {}      
-
-    for r in rows:
-        key = (r.strip_id, r.bundle_no, r.n_unit_x, r.n_unit_y)
+UNIT_PRIORITY = {
+    "NG": 1,
+    "ICS_Recheck": 2,
+    "UNKNOWN": 3,
+    "OK": 4,
+}
 
-        ai = normalize_result(r.afvi_ai_keyin)
-        pri = priority_order.get(ai, 999)
+def lot_rows_stmt(test_ids):
+    exported = [c for c in inspection_result.c if c.name not in DERIVED_COLUMNS]
 
+    points = (
+        select(
+            *exported,
+            ITEMCODE
+        ).distinct(
+            inspection_result.c.test_id,
+            inspection_result.c.body_id
+        ).where(
+            inspection_result.c.test_id.in_(test_ids)
+        ).order_by(
+            inspection_result.c.test_id,
+            inspection_result.c.body_id
+        )
+    ).subquery()
+
+    # Unit order lets consumers group units without holding the whole lot.
+    return select(points).order_by(
+        points.c.test_id,
+        points.c.strip_id,
+        points.c.bundle_no,
+        points.c.n_unit_x,
+        points.c.n_unit_y
+    )
 
-        if key not in groups:
-            groups[key] = []
-        groups[key].append(ai)
+def stream_lot_rows(db, test_ids, batch_size=LOT_STREAM_BATCH):
+    if isinstance(test_ids, int):
+        test_ids = [test_ids]
 
-        if key not in ui_map:
-            ui_map[key] = (pri, r)
-        else:
+    result = db.execute(
+        lot_rows_stmt(test_ids),
+        execution_options={"stream_results": True, "yield_per": batch_size}
+    )
 
-            if pri < ui_map[key][0]:
-                ui_map[key] = (pri, r)
+    try:
+        for batch in result.partitions():
+            for test_id, rows in groupby(batch, key=attrgetter("test_id")):
+                yield test_id, list(rows)
+    finally:
+        result.close()
 
-    ui_list = [row for (_, row) in ui_map.values()]
+def has_lot_rows(db, test_id):
+    return db.scalar(select(exists().where(inspection_result.c.test_id == test_id)))
 
-    return groups, ui_list
+def iter_test_rows(db, test_id):
+    for _, batch in stream_lot_rows(db, test_id):
+        yield from batch
 
 def normalize_result(value):
-    if value and isinstance(value, str) and "AI_OK" in value:
+    if value and isinstance(value, str) and OK_MARK in value:
         return "OK"
-    if value in [
-        "AI_UNKNOWN_NG1", "AI_UNKNOWN_NG1_LOGIT",
-        "AI_NG_NG1", "AI_NG_NG1_LOGIT", "AI_NG_NG1_UNDERCUT"
-    ]:
+    if value in NG_KEYINS:
         return "NG"
-    if value == "AI_ICS_Recheck":
+    if value == ICS_KEYIN:
         return "ICS_Recheck"
-    if isinstance(value, str) and value.startswith("AI_UNKNOWN"):
+    if isinstance(value, str) and value.startswith(UNKNOWN_PREFIX):
         return "UNKNOWN"
     return value
 
-def calculate_under_over_kill(rows):
-    underkill = []
-    overkill = []
-
-    for r in rows:
-        ai = normalize_result(r.afvi_ai_keyin)
-        ivs = (r.ivs_keyin1 or "").strip()
-
-        if ai == "OK" and re.match(r"^s\d+", ivs.lower()):
-            underkill.append(r)
-
-        if ai == "NG" and (ivs == "" or ivs == "Good"):
-            overkill.append(r)
+UNIT_KEY_FIELDS = ("test_id", "strip_id", "bundle_no", "n_unit_x", "n_unit_y")
+
+UNDERKILL_IVS = re.compile(r"^s\d+")
+
+def factorize(values):
+    # Categorical codes in first-seen order, plus the distinct values.
+    categories = list(dict.fromkeys(values))
+    index = {v: i for i, v in enumerate(categories)}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))
+    return codes, categories
+
+def column(rows, name):
+    return list(map(itemgetter(rows[0]._fields.index(name)), rows))
+
+def unit_codes(rows):
+    # rows are in unit order, so a unit starts wherever any key column changes.
+    starts = np.zeros(len(rows), dtype=bool)
+    starts[0] = True
+    for name in UNIT_KEY_FIELDS:
+        values = np.array(column(rows, name), dtype=object)
+        starts[1:] |= values[1:] != values[:-1]
+    return np.cumsum(starts)
+
+def kill_masks(keyins, ivs_values):
+    # Classify each distinct keyin / ivs value once, then broadcast by code.
+    keyin_codes, keyin_cats = factorize(keyins)
+    norms = [normalize_result(k) for k in keyin_cats]
+    priority = np.array([UNIT_PRIORITY.get(n, 999) for n in norms])[keyin_codes]
+    is_ok = np.array([n == "OK" for n in norms])[keyin_codes]
+    is_ng = np.array([n == "NG" for n in norms])[keyin_codes]
+
+    ivs_codes, ivs_cats = factorize(ivs_values)
+    stripped = [(v or "").strip() for v in ivs_cats]
+    ivs_under = np.array([bool(UNDERKILL_IVS.match(v.lower())) for v in stripped])[ivs_codes]
+    ivs_over = np.array([v in ("", "Good") for v in stripped])[ivs_codes]
+
+    return priority, is_ok & ivs_under, is_ng & ivs_over
+
+def best_unit_index(units, priority):
+    # Lowest priority per unit, earliest row on ties; returned in row order.
+    n = len(units)
+    order = np.lexsort((np.arange(n), priority, units))
+    sorted_units = units[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_units[1:] != sorted_units[:-1]
+    return np.sort(order[first])
+
+def split_under_over_kill(rows):
+    # rows are in unit order and cover whole units: keep the highest-priority
+    # row of each unit (first one on ties), then split it into underkill
+    # (AI OK, ivs "s<n>") and overkill (AI NG, ivs empty or "Good").
+    if not rows:
+        return [], []
+
+    priority, under, over = kill_masks(column(rows, "afvi_ai_keyin"), column(rows, "ivs_keyin1"))
+
+    best = best_unit_index(unit_codes(rows), priority)
+    return (
+        [rows[i] for i in best[under[best]]],
+        [rows[i] for i in best[over[best]]],
+    )
 
-    return underkill, overkill
\ No newline at end of file
+def stream_under_over_kill(batches):
+    # batches arrive in unit order (see lot_rows_stmt); a unit cut by a batch
+    # boundary is carried into the next batch before it is classified.
+    underkill, overkill = [], []
+    carry = []
+    unit_key = attrgetter(*UNIT_KEY_FIELDS)
+
+    for batch in batches:
+        rows = carry + batch
+        last = unit_key(rows[-1])
+        cut = len(rows)
+        while cut > 0 and unit_key(rows[cut - 1]) == last:
+            cut -= 1
+
+        under, over = split_under_over_kill(rows[:cut])
+        underkill.extend(under)
+        overkill.extend(over)
+        carry = rows[cut:]
+
+    under, over = split_under_over_kill(carry)
+    underkill.extend(under)
+    overkill.extend(over)
+
+    return underkill, overkill
@@ -0,0 +1,209 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.database import SessionLocal
+from .export_pipeline import iter_export_zip, is_summary_only, load_summary_rows
+from .xlsx_stream import stream_xlsx
+
+EXPORT_DIR = os.getenv("PMS_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "pms_exports"))
+EXPORT_JOBS = int(os.getenv("PMS_EXPORT_JOBS", 2))
+EXPORT_TTL_HOURS = float(os.getenv("PMS_EXPORT_TTL_HOURS", 24))
+
+STATUS_INTERVAL = 1.0
+
+# Queued/running jobs are heartbeated by the process that owns them; one
+# whose heartbeat is older than ORPHAN_AFTER lost its process (restart or
+# crash) and is reported as failed instead of being polled until the TTL.
+HEARTBEAT_INTERVAL = 5.0
+ORPHAN_AFTER = float(os.getenv("PMS_EXPORT_ORPHAN_S", 60))
+
+_runner = ThreadPoolExecutor(max_workers=EXPORT_JOBS, thread_name_prefix="pms-export")
+
+_active_jobs = set()
+_active_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+def job_dir(job_id):
+    return os.path.join(EXPORT_DIR, job_id)
+
+
+def artifact_path(status):
+    return os.path.join(job_dir(status["job_id"]), status["filename"])
+
+
+def write_status(status):
+    # Status lives on disk so every uvicorn/gunicorn worker can answer for it.
+    folder = job_dir(status["job_id"])
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(tmp, os.path.join(folder, "status.json"))
+
+
+def heartbeat_path(job_id):
+    return os.path.join(job_dir(job_id), "heartbeat")
+
+
+def touch_heartbeat(job_id):
+    try:
+        with open(heartbeat_path(job_id), "a"):
+            pass
+        os.utime(heartbeat_path(job_id))
+    except OSError:
+        pass
+
+
+def heartbeat_loop():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with _active_lock:
+            job_ids = list(_active_jobs)
+        for job_id in job_ids:
+            touch_heartbeat(job_id)
+
+
+def track_job(job_id):
+    global _heartbeat_thread
+    touch_heartbeat(job_id)
+    with _active_lock:
+        _active_jobs.add(job_id)
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(
+                target=heartbeat_loop, daemon=True, name="export-heartbeat"
+            )
+            _heartbeat_thread.start()
+
+
+def untrack_job(job_id):
+    with _active_lock:
+        _active_jobs.discard(job_id)
+
+
+def is_orphaned(status):
+    if status["state"] not in ("queued", "running"):
+        return False
+    try:
+        beat = os.path.getmtime(heartbeat_path(status["job_id"]))
+    except OSError:
+        return True
+    return time.time() - beat > ORPHAN_AFTER
+
+
+def fail_job(status, error):
+    status["state"] = "failed"
+    status["error"] = error
+    write_status(status)
+    return status
+
+
+def read_status(job_id):
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(job_dir(job_id), "status.json"), encoding="utf-8") as f:
+            status = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if is_orphaned(status):
+        return fail_job(status, "서버 재시작으로 작업이 중단되었습니다.")
+    return status
+
+
+def fail_orphaned_jobs():
+    # Called at startup; jobs still heartbeated by a sibling worker are kept.
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    for name in os.listdir(EXPORT_DIR):
+        if os.path.isfile(os.path.join(job_dir(name), "status.json")):
+            read_status(name)
+
+
+def cleanup_expired_jobs():
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - EXPORT_TTL_HOURS * 3600
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def submit_export_job(test_list, excel_options):
+    cleanup_expired_jobs()
+
+    job_id = uuid.uuid4().hex
+    today_str = datetime.date.today().strftime("%Y%m%d")
+    summary_only = is_summary_only(excel_options)
+
+    status = {
+        "job_id": job_id,
+        "state": "queued",
+        "tests_total": 0 if summary_only else len(test_list),
+        "tests_done": 0,
+        "bytes_written": 0,
+        "filename": f"SUMMARY_{today_str}.xlsx" if summary_only else f"AI_RESULT_{today_str}.zip",
+        "error": None,
+    }
+
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    write_status(status)
+    track_job(job_id)
+
+    _runner.submit(run_export_job, dict(status), test_list, excel_options, today_str)
+    return status
+
+
+def run_export_job(status, test_list, excel_options, today_str):
+    status["state"] = "running"
+    write_status(status)
+
+    def on_test_done():
+        status["tests_done"] += 1
+        write_status(status)
+
+    try:
+        db = SessionLocal()
+        try:
+            summary_rows = load_summary_rows(db, test_list)
+        finally:
+            db.close()
+
+        if is_summary_only(excel_options):
+            chunks = stream_xlsx(summary_rows, "SUMMARY")
+        else:
+            chunks = iter_export_zip(
+                test_list,
+                excel_options,
+                summary_rows if excel_options.get("summary") else None,
+                f"SUMMARY_{today_str}.xlsx",
+                on_test_done=on_test_done,
+            )
+
+        path = artifact_path(status)
+        last_report = time.monotonic()
+        with open(path + ".part", "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                status["bytes_written"] += len(chunk)
+                if time.monotonic() - last_report >= STATUS_INTERVAL:
+                    write_status(status)
+                    last_report = time.monotonic()
+        os.replace(path + ".part", path)
+
+        status["state"] = "done"
+    except Exception as e:
+        status["state"] = "failed"
+        status["error"] = str(e)
+    finally:
+        untrack_job(status["job_id"])
+
+    write_status(status)
@@ -0,0 +1,184 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from app.database import engine, SessionLocal
+from .columnar_export import COLUMNAR_FORMATS, arrow_schema, write_columnar
+from .data_service import (
+    LOT_STREAM_BATCH,
+    has_lot_rows,
+    iter_test_rows,
+    lot_rows_stmt,
+    stream_lot_rows,
+    stream_under_over_kill,
+)
+from .summary_store import load_multi_summaries
+from .xlsx_stream import stream_xlsx
+
+EXPORT_WORKERS = int(os.getenv("PMS_EXPORT_WORKERS", min(4, os.cpu_count() or 1)))
+
+FILE_CHUNK = 1024 * 1024
+
+_pool = None
+
+
+def _init_worker():
+    # Pooled connections inherited from the parent belong to the parent.
+    engine.dispose(close=False)
+
+
+def get_export_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, initializer=_init_worker)
+    return _pool
+
+
+def build_rawdata_excel(rows):
+    return stream_xlsx(rows, "RAWDATA")
+
+
+def write_chunks(path, chunks):
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return path
+
+
+def row_batches(rows, size=LOT_STREAM_BATCH):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def export_test_files(index, test, excel_options, work_dir):
+    # Runs in a worker process: one session per worker, files go to disk.
+    test_id = test["id"]
+    folder = f"{test['lot']}_{test['version']}"
+    fmt = excel_options.get("format", "xlsx")
+    columnar = fmt in COLUMNAR_FORMATS
+    ext = COLUMNAR_FORMATS[fmt] if columnar else ".xlsx"
+    files = []
+
+    def add(kind, rows=None, batches=None):
+        path = os.path.join(work_dir, f"{index}_{kind}{ext}")
+        if columnar:
+            write_columnar(path, batches or row_batches(rows), arrow_schema(lot_rows_stmt([test_id])), fmt)
+        else:
+            write_chunks(path, build_rawdata_excel(rows))
+        files.append((f"{folder}/{folder}_{kind}{ext}", path))
+
+    db = SessionLocal()
+    try:
+        if excel_options.get("rawdata") and has_lot_rows(db, test_id):
+            if columnar:
+                add("rawdata", batches=(batch for _, batch in stream_lot_rows(db, test_id)))
+            else:
+                add("rawdata", iter_test_rows(db, test_id))
+
+        if excel_options.get("underkill") or excel_options.get("overkill"):
+            underkill, overkill = stream_under_over_kill(
+                batch for _, batch in stream_lot_rows(db, test_id)
+            )
+
+            if excel_options.get("underkill") and underkill:
+                add("underkill", underkill)
+
+            if excel_options.get("overkill") and overkill:
+                add("overkill", overkill)
+    finally:
+        db.close()
+
+    return files
+
+
+class ZipSink(io.RawIOBase):
+    # Unseekable target for zipfile; the written bytes are drained as chunks.
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def iter_file(path):
+    with open(path, "rb") as f:
+        while chunk := f.read(FILE_CHUNK):
+            yield chunk
+
+
+def write_entry(z, sink, arcname, chunks):
+    with z.open(arcname, "w", force_zip64=True) as entry:
+        for chunk in chunks:
+            entry.write(chunk)
+            if sink.size >= FILE_CHUNK:
+                yield sink.drain()
+    yield sink.drain()
+
+
+def is_summary_only(excel_options):
+    return (
+        excel_options.get("summary") is True
+        and not excel_options.get("rawdata")
+        and not excel_options.get("underkill")
+        and not excel_options.get("overkill")
+    )
+
+
+def load_summary_rows(db, test_list):
+    summaries = load_multi_summaries(db, [t["id"] for t in test_list])
+
+    summary_rows = []
+    for t in test_list:
+        test_id = t["id"]
+        row = summaries[test_id]
+        row["test_id"] = test_id
+        summary_rows.append(row)
+
+    return summary_rows
+
+
+def iter_export_zip(test_list, excel_options, summary_rows, summary_name, on_test_done=None):
+    work_dir = tempfile.mkdtemp(prefix="pms_export_")
+    pool = get_export_pool()
+
+    futures = [
+        pool.submit(export_test_files, i, t, excel_options, work_dir)
+        for i, t in enumerate(test_list)
+    ]
+
+    sink = ZipSink()
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            # Tests run concurrently but land in the zip in request order.
+            for future in futures:
+                for arcname, path in future.result():
+                    yield from write_entry(z, sink, arcname, iter_file(path))
+                    os.remove(path)
+                if on_test_done:
+                    on_test_done()
+
+            if summary_rows:
+                yield from write_entry(z, sink, summary_name, stream_xlsx(summary_rows, "SUMMARY"))
+
+        yield sink.drain()
+    finally:
+        for future in futures:
+            future.cancel()
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy.engine import Row, RowMapping
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_default(value):
+    # orjson handles dict/list/datetime/UUID/numpy itself; this covers the rest.
+    if isinstance(value, Row):
+        return value._asdict()
+    if isinstance(value, RowMapping):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError
+
+
+def dumps(content):
+    return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    # Returning this directly from an endpoint also skips jsonable_encoder.
+    def render(self, content):
+        return dumps(content)
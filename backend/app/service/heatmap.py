@@ -0,0 +1,123 @@
+import asyncio
+
+import numpy as np
+from sqlalchemy import select, func, cast, Integer
+
+from app.database import fetch_all, fetch_one
+from app.model import inspection_result
+from .data_service import safe_float
+from .query_build import NORMALIZED_RESULT
+from .coerce import coerce_values
+
+HEATMAP_BINS = 32
+MAX_HEATMAP_BINS = 256
+
+UNIT_X = cast(safe_float(inspection_result.c.n_unit_x), Integer)
+UNIT_Y = cast(safe_float(inspection_result.c.n_unit_y), Integer)
+REL_X = safe_float(inspection_result.c.rel_x_unit)
+REL_Y = safe_float(inspection_result.c.rel_y_unit)
+
+
+def heatmap_filters(stmt, test_id, norms=None, defects=None, sorters=None):
+    stmt = stmt.where(inspection_result.c.test_id == test_id)
+
+    for col, values in (
+        (NORMALIZED_RESULT, norms),
+        (inspection_result.c.afvi_ai_defect, defects),
+        (inspection_result.c.bundle_no, sorters),
+    ):
+        if values:
+            stmt = stmt.where(col.in_(coerce_values(col, values)))
+
+    return stmt
+
+
+def unit_grid_stmt(test_id, **filters):
+    # Points per unit position, summed over every strip of the test.
+    x = UNIT_X.label("x")
+    y = UNIT_Y.label("y")
+    return heatmap_filters(
+        select(x, y, func.count().label("cnt")), test_id, **filters
+    ).where(UNIT_X >= 0, UNIT_Y >= 0).group_by(x, y)
+
+
+def rel_bounds_stmt(test_id, **filters):
+    return heatmap_filters(
+        select(
+            func.min(REL_X).label("x_min"),
+            func.max(REL_X).label("x_max"),
+            func.min(REL_Y).label("y_min"),
+            func.max(REL_Y).label("y_max"),
+        ),
+        test_id, **filters
+    ).where(REL_X != -1, REL_Y != -1)
+
+
+def rel_bucket(col, low, high, bins):
+    # width_bucket puts col == high in bins + 1; fold it into the last bin.
+    return func.least(func.width_bucket(col, low, high, bins), bins) - 1
+
+
+def rel_bins_stmt(test_id, bounds, bins, **filters):
+    x_min, x_max, y_min, y_max = bounds
+    x = rel_bucket(REL_X, x_min, x_max, bins).label("x")
+    y = rel_bucket(REL_Y, y_min, y_max, bins).label("y")
+    return heatmap_filters(
+        select(x, y, func.count().label("cnt")), test_id, **filters
+    ).where(REL_X != -1, REL_Y != -1).group_by(x, y)
+
+
+def dense_grid(rows, width, height, x0=0, y0=0):
+    grid = np.zeros((height, width), dtype=np.int64)
+    if rows:
+        x, y, cnt = (np.array(v, dtype=np.int64) for v in zip(*rows))
+        grid[y - y0, x - x0] = cnt
+    return grid
+
+
+def unit_heatmap(rows):
+    if not rows:
+        return {"x0": 0, "y0": 0, "width": 0, "height": 0, "counts": []}
+
+    xs = [r.x for r in rows]
+    ys = [r.y for r in rows]
+    x0, y0 = min(xs), min(ys)
+    width, height = max(xs) - x0 + 1, max(ys) - y0 + 1
+
+    return {
+        "x0": x0,
+        "y0": y0,
+        "width": width,
+        "height": height,
+        "counts": dense_grid(rows, width, height, x0, y0),
+    }
+
+
+def bin_range(low, high):
+    # width_bucket rejects low == high; a single-valued axis lands in bin 0.
+    low, high = float(low), float(high)
+    return (low, high) if high > low else (low, low + 1.0)
+
+
+async def load_heatmap(test_id, bins=HEATMAP_BINS, **filters):
+    unit_rows, bounds = await asyncio.gather(
+        fetch_all(unit_grid_stmt(test_id, **filters)),
+        fetch_one(rel_bounds_stmt(test_id, **filters)),
+    )
+
+    result = {"unit": unit_heatmap(unit_rows), "rel": None, "total": sum(r.cnt for r in unit_rows)}
+
+    if bounds.x_min is None:
+        return result
+
+    x_range = bin_range(bounds.x_min, bounds.x_max)
+    y_range = bin_range(bounds.y_min, bounds.y_max)
+    rel_rows = await fetch_all(rel_bins_stmt(test_id, x_range + y_range, bins, **filters))
+
+    result["rel"] = {
+        "bins": bins,
+        "x_range": x_range,
+        "y_range": y_range,
+        "counts": dense_grid(rel_rows, bins, bins),
+    }
+    return result
@@ -0,0 +1,22 @@
+import re
+
+from fastapi import HTTPException
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        raise HTTPException(416, "Range 형식 오류", headers={"Content-Range": f"bytes */{size}"})
+
+    start, end = match.group(1), match.group(2)
+    if start == "":
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start, end = int(start), (min(int(end), size - 1) if end else size - 1)
+
+    if start >= size or start > end:
+        raise HTTPException(416, "Range 범위 오류", headers={"Content-Range": f"bytes */{size}"})
+
+    return start, end
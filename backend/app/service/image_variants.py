@@ -0,0 +1,202 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+from .bmp_region import open_bmp, read_region
+from .cache import LRUCache
+
+VARIANT_DIR = os.getenv("PMS_THUMB_DIR", os.path.join(tempfile.gettempdir(), "pms_thumbs"))
+VARIANT_CACHE_BYTES = int(os.getenv("PMS_THUMB_CACHE_MB", 1024)) * 1024 * 1024
+
+THUMB_SIZES = (128, 256, 512)
+TILE_SIZE = 256
+WEBP_QUALITY = 85
+
+_lock = threading.Lock()
+_cache_bytes = None
+
+# Sources the bmp reader can't slice are decoded once and reused for every
+# full-resolution tile cut from them.
+decoded_sources = LRUCache(maxsize=4, max_bytes=512 * 1024 * 1024, sizeof=lambda img: img.nbytes)
+
+
+def variant_key(path, *params):
+    key = "|".join(str(p) for p in (path, os.path.getmtime(path)) + params)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def variant_path(key):
+    return os.path.join(VARIANT_DIR, key[:2], key + ".webp")
+
+
+def read_image(path, flags=cv2.IMREAD_UNCHANGED):
+    with open(path, "rb") as f:
+        return cv2.imdecode(np.frombuffer(f.read(), dtype=np.uint8), flags)
+
+
+def encode_webp(img):
+    _, buffer = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])
+    return buffer.tobytes()
+
+
+def iter_variant_files():
+    for dirpath, _, filenames in os.walk(VARIANT_DIR):
+        for name in filenames:
+            if name.endswith(".webp"):
+                yield os.path.join(dirpath, name)
+
+
+def evict_variants():
+    # Oldest-touched first until the cache is back under 90% of its cap.
+    global _cache_bytes
+    entries = []
+    for path in iter_variant_files():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    target = VARIANT_CACHE_BYTES * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+    _cache_bytes = total
+
+
+def track_variant_bytes(size):
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(os.path.getsize(p) for p in iter_variant_files())
+        else:
+            _cache_bytes += size
+
+        if _cache_bytes > VARIANT_CACHE_BYTES:
+            evict_variants()
+
+
+def cached_variant(key, build):
+    # On-disk LRU: a hit touches the file, eviction drops the stalest ones.
+    path = variant_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except FileNotFoundError:
+        pass
+
+    img = build()
+    if img is None:
+        return None
+
+    data = encode_webp(img)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    track_variant_bytes(len(data))
+    return data
+
+
+def build_thumbnail(path, size):
+    img = read_image(path)
+    if img is None:
+        return None
+
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1:
+        return img
+
+    return cv2.resize(
+        img, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+    )
+
+
+def image_size(path):
+    with open_bmp(path) as (_, header):
+        if header is not None:
+            return header["width"], header["height"]
+
+    img = read_image(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return img.shape[1], img.shape[0]
+
+
+def tile_levels(width, height):
+    # Level 0 is full resolution; each level halves it until one tile fits.
+    levels = 1
+    while max(width, height) > TILE_SIZE << (levels - 1):
+        levels += 1
+    return levels
+
+
+def source_tile(path, col, row):
+    x1, y1 = col * TILE_SIZE, row * TILE_SIZE
+
+    with open_bmp(path) as (mm, header):
+        if header is not None:
+            width, height = header["width"], header["height"]
+            if x1 >= width or y1 >= height:
+                return None
+            return read_region(
+                mm, header, x1, y1, min(width, x1 + TILE_SIZE), min(height, y1 + TILE_SIZE)
+            )
+
+    full = decoded_sources.get_or_set(
+        (path, os.path.getmtime(path)), lambda: read_image(path, cv2.IMREAD_GRAYSCALE)
+    )
+    if full is None:
+        return None
+    height, width = full.shape
+    if x1 >= width or y1 >= height:
+        return None
+    return full[y1:y1 + TILE_SIZE, x1:x1 + TILE_SIZE].copy()
+
+
+def cached_tile(path, level, col, row):
+    data = cached_variant(
+        variant_key(path, "tile", level, col, row), lambda: build_tile(path, level, col, row)
+    )
+    if data is None:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+def build_tile(path, level, col, row):
+    # Level 0 reads one tile of source pixels; every other level halves the
+    # 2x2 block of cached tiles below it, so no build reads more than four
+    # tiles whatever the level.
+    if level == 0:
+        return source_tile(path, col, row)
+
+    quad = [
+        [cached_tile(path, level - 1, col * 2 + dx, row * 2 + dy) for dx in (0, 1)]
+        for dy in (0, 1)
+    ]
+    if quad[0][0] is None:
+        return None
+
+    mosaic = np.vstack([
+        np.hstack([t for t in tiles if t is not None])
+        for tiles in quad if tiles[0] is not None
+    ])
+
+    h, w = mosaic.shape[:2]
+    return cv2.resize(mosaic, (max(1, w // 2), max(1, h // 2)), interpolation=cv2.INTER_AREA)
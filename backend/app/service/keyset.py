@@ -0,0 +1,69 @@
+import base64
+import hashlib
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, false, literal
+
+from .coerce import coerce_value
+
+# Keyset pagination over columns that may be NULL. Ascending order puts
+# NULLs last and descending puts them first, so "desc" is the exact reverse
+# of "asc" and the seek predicate below can spell NULLs out explicitly
+# (a row comparison with a NULL would be NULL and silently drop rows).
+
+
+def keyset_order(cols, desc=False):
+    return [c.desc().nulls_first() if desc else c.asc().nulls_last() for c in cols]
+
+
+def key_equal(col, value):
+    return col.is_(None) if value is None else col == literal(value, col.type)
+
+
+def key_after(col, value, desc):
+    if value is None:
+        # NULL sorts last ascending: nothing comes after it but other NULLs.
+        return col.isnot(None) if desc else false()
+    value = literal(value, col.type)
+    return col < value if desc else or_(col > value, col.is_(None))
+
+
+def keyset_after(cols, values, desc=False):
+    # (k0 after v0) OR (k0 = v0 AND k1 after v1) OR ...
+    terms = []
+    for i, (col, value) in enumerate(zip(cols, values)):
+        equal = [key_equal(c, v) for c, v in zip(cols[:i], values[:i])]
+        terms.append(and_(*equal, key_after(col, value, desc)))
+    return or_(*terms)
+
+
+def cursor_signature(query_key):
+    # A cursor is only valid for the ordering and filters it was cut from.
+    if query_key is None:
+        return None
+    raw = json.dumps(query_key, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def encode_cursor(values, query_key=None):
+    token = {"keys": values, "sig": cursor_signature(query_key)}
+    raw = json.dumps(token, default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(token, cols, query_key=None):
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        values = decoded["keys"]
+        if not isinstance(values, list) or len(values) != len(cols):
+            raise ValueError(token)
+        # JSON carries Decimal/date keys as strings; restore the column
+        # types so they are bound as such instead of as VARCHAR.
+        values = [coerce_value(c, v) for c, v in zip(cols, values)]
+    except Exception:
+        raise HTTPException(400, "cursor 형식 오류")
+
+    if decoded.get("sig") != cursor_signature(query_key):
+        raise HTTPException(400, "cursor 가 현재 정렬/필터 조건과 다름")
+    return values
@@ -1,27 +1,19 @@
-from sqlalchemy import case, select
 from app.model import inspection_result
+from app.model.norm_result import normalized_result_expr, priority_expr
+from app.model.search_keys import itemcode_expr, lot_key_expr
 
-NORMALIZED_RESULT = case(
-    (inspection_result.c.afvi_ai_keyin.ilike("%AI_OK%"), "OK"),
-    (
-        inspection_result.c.afvi_ai_keyin.in_([
-            "AI_UNKNOWN_NG1",
-            "AI_UNKNOWN_NG1_LOGIT",
-            "AI_NG_NG1",
-            "AI_NG_NG1_LOGIT",
-            "AI_NG_NG1_UNDERCUT"
-        ]),
-        "NG"
-    ),
-    (inspection_result.c.afvi_ai_keyin == "AI_ICS_Recheck", "ICS_Recheck"),
-    (inspection_result.c.afvi_ai_keyin.ilike("AI_UNKNOWN%"), "UNKNOWN"),
-    else_=inspection_result.c.afvi_ai_keyin
-).label("norm_result")
-
-PRIORITY = case(
-    (NORMALIZED_RESULT == "NG", 1),
-    (NORMALIZED_RESULT == "ICS_Recheck", 2),
-    (NORMALIZED_RESULT == "UNKNOWN", 3),
-    else_=4
-).label("priority")
+if "norm_result" in inspection_result.c:
+    # Served from mv_inspection_result, where both are precomputed and indexed.
+    NORMALIZED_RESULT = inspection_result.c.norm_result.label("norm_result")
+    PRIORITY = inspection_result.c.priority.label("priority")
+else:
+    NORMALIZED_RESULT = normalized_result_expr(inspection_result.c.afvi_ai_keyin).label("norm_result")
+    PRIORITY = priority_expr(NORMALIZED_RESULT).label("priority")
 
+if "itemcode" in inspection_result.c:
+    # Materialized with btree and trigram indexes (see app.model.inspection_norm).
+    ITEMCODE = inspection_result.c.itemcode.label("itemcode")
+    LOT_KEY = inspection_result.c.lot_key.label("lot_key")
+else:
+    ITEMCODE = itemcode_expr(inspection_result.c.file_name).label("itemcode")
+    LOT_KEY = lot_key_expr(inspection_result.c.lot_no).label("lot_key")
@@ -0,0 +1,49 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+IMAGE_ROOT = os.getenv("PMS_IMAGE_ROOT", r"\\10.0.0.225\ati\VS DATA")
+
+SHARE_IO_WORKERS = int(os.getenv("PMS_SHARE_IO_WORKERS", 8))
+SHARE_IO_TIMEOUT = float(os.getenv("PMS_SHARE_IO_TIMEOUT", 20))
+
+# Share reads get their own threads, so a slow SMB link queues here instead
+# of in the threadpool the /api/pms/* endpoints run on. One slot per worker
+# thread, so a call that holds a slot always has a thread to run on.
+_executor = ThreadPoolExecutor(max_workers=SHARE_IO_WORKERS, thread_name_prefix="share-io")
+_slots = asyncio.Semaphore(SHARE_IO_WORKERS)
+
+
+def resolve_image_path(rel_path):
+    # Keeps requests inside IMAGE_ROOT ("../" and absolute paths are refused).
+    root = os.path.realpath(IMAGE_ROOT)
+    path = os.path.realpath(os.path.join(root, rel_path.lstrip("/\\")))
+    try:
+        inside = os.path.commonpath([root, path]) == root
+    except ValueError:
+        # Different drives (or UNC share vs drive) on Windows.
+        inside = False
+    return path if inside else None
+
+
+async def run_share_io(fn, *args, timeout=SHARE_IO_TIMEOUT):
+    loop = asyncio.get_running_loop()
+
+    async def run():
+        await _slots.acquire()
+        try:
+            future = _executor.submit(fn, *args)
+        except BaseException:
+            _slots.release()
+            raise
+        # The slot is freed when the thread finishes, not when the caller
+        # gives up: a timed-out read still occupies its worker until then.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(_slots.release))
+        return await asyncio.wrap_future(future)
+
+    try:
+        return await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "이미지 공유폴더 응답 시간 초과")
@@ -0,0 +1,238 @@
+import asyncio
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, delete, insert, func, cast, BigInteger
+from app.database import engine, SessionLocal, async_session, fetch_all
+from app.model import inspection_result, summary_info, summary_counts
+from app.model.summary_store import metadata
+from .coerce import coerce_values
+from .data_service import (
+    summary_info_stmt,
+    summary_counts_stmt,
+    assemble_multi_summary,
+    build_summary_from_counts,
+    group_by_test,
+)
+
+_store_ready = False
+
+STORE_DDL_LOCK_ID = 0x504D5353  # "PMSS"
+
+def ensure_summary_store():
+    # The DDL commits on its own connection, so a request transaction that
+    # later rolls back (or never commits) cannot take the tables with it.
+    global _store_ready
+    if not _store_ready:
+        with engine.begin() as conn:
+            conn.execute(select(func.pg_advisory_xact_lock(STORE_DDL_LOCK_ID)))
+            metadata.create_all(conn, checkfirst=True)
+        _store_ready = True
+
+
+def prepare_summary_store():
+    # Called from the app lifespan so the DDL stays off request paths; if the
+    # database is not reachable yet, the first store access retries it.
+    try:
+        ensure_summary_store()
+    except Exception as e:
+        print(f"[WARNING] Summary store setup failed: {e}")
+
+
+def stored_test_ids(db, test_ids):
+    stmt = select(summary_info.c.test_id).where(summary_info.c.test_id.in_(test_ids))
+    return {r.test_id for r in db.execute(stmt).fetchall()}
+
+
+def compute_test_summaries(db, test_ids):
+    base_filter = inspection_result.c.test_id.in_(test_ids)
+
+    info_stmt = summary_info_stmt([base_filter]).add_columns(
+        func.max(inspection_result.c.ai_date_time)
+        .over(partition_by=inspection_result.c.test_id)
+        .label("source_dt")
+    )
+    info_rows = db.execute(info_stmt).fetchall()
+
+    count_rows = db.execute(
+        summary_counts_stmt(
+            [base_filter],
+            inspection_result.c.test_id,
+            inspection_result.c.bundle_no,
+        )
+    ).fetchall()
+
+    return info_rows, count_rows
+
+
+def write_test_summaries(db, info_rows, count_rows):
+    if info_rows:
+        db.execute(insert(summary_info), [
+            {c.name: r._mapping[c.name] for c in summary_info.columns}
+            for r in info_rows
+        ])
+
+    if count_rows:
+        db.execute(insert(summary_counts), [dict(r._mapping) for r in count_rows])
+
+
+def refresh_summary_store(db, test_ids):
+    ensure_summary_store()
+
+    missing = sorted(set(test_ids) - stored_test_ids(db, test_ids))
+    if not missing:
+        return
+
+    # Serialize concurrent refreshes of the same tests, then re-check.
+    for test_id in missing:
+        db.execute(select(func.pg_advisory_xact_lock(test_id)))
+    missing = sorted(set(missing) - stored_test_ids(db, missing))
+
+    if missing:
+        info_rows, count_rows = compute_test_summaries(db, missing)
+        write_test_summaries(db, info_rows, count_rows)
+    db.commit()
+
+
+def invalidate_summary_store(db, test_ids):
+    ensure_summary_store()
+
+    db.execute(delete(summary_counts).where(summary_counts.c.test_id.in_(test_ids)))
+    db.execute(delete(summary_info).where(summary_info.c.test_id.in_(test_ids)))
+    db.commit()
+
+
+def find_stale_tests(db, test_ids):
+    ensure_summary_store()
+
+    current_stmt = (
+        select(
+            inspection_result.c.test_id,
+            func.max(inspection_result.c.ai_date_time).label("source_dt"),
+        )
+        .where(inspection_result.c.test_id.in_(test_ids))
+        .group_by(inspection_result.c.test_id)
+    )
+    current = dict(db.execute(current_stmt).fetchall())
+
+    stored_stmt = select(summary_info.c.test_id, summary_info.c.source_dt).where(
+        summary_info.c.test_id.in_(test_ids)
+    )
+    stored = dict(db.execute(stored_stmt).fetchall())
+
+    return sorted(
+        tid for tid, source_dt in stored.items()
+        if current.get(tid) != source_dt
+    )
+
+
+def summed_counts_stmt(*group_cols):
+    c = summary_counts.c
+    keys = [*group_cols, c.afvi_ai_keyin, c.afvi_ai_defect, c.norm_result]
+    return (
+        select(
+            *keys,
+            cast(func.sum(c.point_cnt), BigInteger).label("point_cnt"),
+            cast(func.sum(c.unit_cnt), BigInteger).label("unit_cnt"),
+            cast(func.sum(c.underk_cnt), BigInteger).label("underk_cnt"),
+            cast(func.sum(c.overk_cnt), BigInteger).label("overk_cnt"),
+        )
+        .group_by(*keys)
+    )
+
+
+def refresh_stale_summaries(db, test_ids):
+    stale = find_stale_tests(db, test_ids)
+    if stale:
+        invalidate_summary_store(db, stale)
+    refresh_summary_store(db, test_ids)
+    return stale
+
+
+def invalidate_stale_summaries():
+    # Run after each view refresh, off the request path: drop every stored
+    # summary whose source has moved on, and loads rebuild it on demand.
+    with SessionLocal() as db:
+        ensure_summary_store()
+        test_ids = [r.test_id for r in db.execute(select(summary_info.c.test_id)).fetchall()]
+        if not test_ids:
+            return []
+        stale = find_stale_tests(db, test_ids)
+        if stale:
+            invalidate_summary_store(db, stale)
+        return stale
+
+
+def multi_info_stmt(test_ids):
+    return select(summary_info).where(summary_info.c.test_id.in_(test_ids))
+
+
+def multi_counts_stmt(test_ids):
+    return (
+        summed_counts_stmt(summary_counts.c.test_id)
+        .where(summary_counts.c.test_id.in_(test_ids))
+    )
+
+
+def detail_counts_stmt(test_id, sorter_values=None):
+    stmt = summed_counts_stmt().where(summary_counts.c.test_id == test_id)
+    if sorter_values:
+        bundle_no = summary_counts.c.bundle_no
+        stmt = stmt.where(bundle_no.in_(coerce_values(bundle_no, sorter_values)))
+    return stmt
+
+
+def assemble_multi_summaries(test_ids, info_rows, count_rows):
+    info_map = {r.test_id: r for r in info_rows}
+    counts_map = group_by_test(count_rows)
+
+    return {
+        tid: assemble_multi_summary(info_map[tid], counts_map.get(tid, []))
+        if tid in info_map else None
+        for tid in test_ids
+    }
+
+
+def load_multi_summaries(db, test_ids):
+    refresh_summary_store(db, test_ids)
+
+    info_rows = db.execute(multi_info_stmt(test_ids)).fetchall()
+    count_rows = db.execute(multi_counts_stmt(test_ids)).fetchall()
+
+    return assemble_multi_summaries(test_ids, info_rows, count_rows)
+
+
+def load_detail_summary(db, test_id, sorter_values=None):
+    refresh_summary_store(db, [test_id])
+
+    count_rows = db.execute(detail_counts_stmt(test_id, sorter_values)).fetchall()
+
+    return build_summary_from_counts(count_rows)
+
+
+async def run_store_sync(fn, *args):
+    # Store maintenance (advisory locks, inserts, commit) stays sync code,
+    # run on an async session's connection. The DDL uses the sync engine,
+    # so it must not run there.
+    if not _store_ready:
+        await run_in_threadpool(ensure_summary_store)
+    async with async_session() as session:
+        return await session.run_sync(fn, *args)
+
+
+async def load_multi_summaries_async(test_ids):
+    await run_store_sync(refresh_summary_store, test_ids)
+
+    info_rows, count_rows = await asyncio.gather(
+        fetch_all(multi_info_stmt(test_ids)),
+        fetch_all(multi_counts_stmt(test_ids)),
+    )
+
+    return assemble_multi_summaries(test_ids, info_rows, count_rows)
+
+
+async def load_detail_summary_async(test_id, sorter_values=None):
+    await run_store_sync(refresh_summary_store, [test_id])
+
+    count_rows = await fetch_all(detail_counts_stmt(test_id, sorter_values))
+
+    return build_summary_from_counts(count_rows)
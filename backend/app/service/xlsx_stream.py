@@ -0,0 +1,241 @@
+import datetime
+import itertools
+import math
+import re
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+import zipstream
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+CHUNK_ROWS = 1000
+
+# Excel's sheet limit is 1,048,576 rows, one of which is the header.
+MAX_SHEET_ROWS = 1048575
+
+_END = object()
+
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# cellXfs indexes in STYLES_XML
+STYLE_DATETIME = 1
+STYLE_DATE = 2
+STYLE_TIME = 3
+
+STYLES_XML = (
+    XML_HEAD
+    + f'<styleSheet xmlns="{NS_MAIN}">'
+    '<numFmts count="3">'
+    '<numFmt numFmtId="164" formatCode="yyyy-mm-dd h:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="166" formatCode="h:mm:ss"/>'
+    '</numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="166" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+ROOT_RELS_XML = (
+    XML_HEAD
+    + f'<Relationships xmlns="{NS_PKG_REL}">'
+    f'<Relationship Id="rId1" Type="{NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+
+def content_types_xml(sheet_count):
+    sheets = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    return (
+        XML_HEAD
+        + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + sheets
+        + '</Types>'
+    )
+
+
+def workbook_xml(titles):
+    sheets = "".join(
+        f'<sheet name={quoteattr(title[:31])} sheetId="{i}" r:id="rId{i}"/>'
+        for i, title in enumerate(titles, start=1)
+    )
+    return (
+        XML_HEAD
+        + f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+        f'<sheets>{sheets}</sheets>'
+        '</workbook>'
+    )
+
+
+def workbook_rels_xml(sheet_count):
+    sheets = "".join(
+        f'<Relationship Id="rId{i}" Type="{NS_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    return (
+        XML_HEAD
+        + f'<Relationships xmlns="{NS_PKG_REL}">'
+        + sheets
+        + f'<Relationship Id="rId{sheet_count + 1}" Type="{NS_REL}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    )
+
+
+def column_letter(idx):
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def inline_str(ref, value):
+    text = escape(ILLEGAL_CHARS.sub("", value))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def cell_xml(ref, value):
+    if value is None:
+        return ""
+
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+
+    if isinstance(value, (int, float, Decimal)):
+        # NaN/inf in a <v> makes Excel reject the workbook.
+        if isinstance(value, Decimal) and not value.is_finite():
+            return inline_str(ref, str(value))
+        if isinstance(value, float) and not math.isfinite(value):
+            return inline_str(ref, str(value))
+        return f'<c r="{ref}"><v>{value}</v></c>'
+
+    if isinstance(value, datetime.datetime):
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH) / datetime.timedelta(days=1)
+        return f'<c r="{ref}" s="{STYLE_DATETIME}"><v>{serial}</v></c>'
+
+    if isinstance(value, datetime.date):
+        serial = (value - EXCEL_EPOCH.date()).days
+        return f'<c r="{ref}" s="{STYLE_DATE}"><v>{serial}</v></c>'
+
+    if isinstance(value, datetime.time):
+        seconds = value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+        return f'<c r="{ref}" s="{STYLE_TIME}"><v>{seconds / 86400}</v></c>'
+
+    return inline_str(ref, str(value))
+
+
+def row_xml(row_no, values, letters):
+    cells = "".join(
+        cell_xml(f"{letters[i]}{row_no}", v) for i, v in enumerate(values)
+    )
+    return f'<row r="{row_no}">{cells}</row>'
+
+
+def row_reader(sample):
+    if hasattr(sample, "_mapping"):
+        headers = list(sample._mapping.keys())
+        return headers, lambda raw: [raw._mapping.get(h) for h in headers]
+
+    if isinstance(sample, tuple):
+        headers = list(sample[0]._mapping.keys())
+        return headers, lambda r: [r[0]._mapping.get(h) for h in headers]
+
+    headers = list(sample.keys())
+    return headers, lambda raw: [raw.get(h) for h in headers]
+
+
+def sheet_xml(rows, headers, read):
+    letters = [column_letter(i) for i in range(len(headers))]
+
+    yield (
+        XML_HEAD
+        + f'<worksheet xmlns="{NS_MAIN}"><sheetData>'
+        + (row_xml(1, headers, letters) if headers else "")
+    ).encode("utf-8")
+
+    chunk = []
+    if read is not None:
+        for row_no, r in enumerate(rows, start=2):
+            chunk.append(row_xml(row_no, read(r), letters))
+            if len(chunk) >= CHUNK_ROWS:
+                yield "".join(chunk).encode("utf-8")
+                chunk = []
+
+    chunk.append("</sheetData></worksheet>")
+    yield "".join(chunk).encode("utf-8")
+
+
+def stream_xlsx(rows, sheet_title):
+    # An .xlsx is itself a zip, so the workbook is streamed through zipstream
+    # and the sheet XML is generated row chunk by row chunk as it is read.
+    # Past MAX_SHEET_ROWS the rows continue on {title}_2, {title}_3, ...; the
+    # workbook parts that list the sheets are written last, once the count
+    # is known.
+    book = zipstream.ZipFile(mode="w", compression=zipstream.ZIP_DEFLATED)
+    state = {"rows": iter(rows), "headers": None, "read": None}
+    titles = []
+
+    def add_sheet():
+        titles.append(sheet_title if not titles else f"{sheet_title}_{len(titles) + 1}")
+        book.write_iter(f"xl/worksheets/sheet{len(titles)}.xml", next_sheet())
+
+    def next_sheet():
+        # Rows are only pulled once zipstream reaches this entry.
+        if state["headers"] is None:
+            sample = next(state["rows"], _END)
+            if sample is _END:
+                state["headers"] = []
+            else:
+                state["headers"], state["read"] = row_reader(sample)
+                state["rows"] = itertools.chain([sample], state["rows"])
+
+        yield from sheet_xml(
+            itertools.islice(state["rows"], MAX_SHEET_ROWS), state["headers"], state["read"]
+        )
+
+        following = next(state["rows"], _END)
+        if following is _END:
+            add_workbook_parts()
+        else:
+            state["rows"] = itertools.chain([following], state["rows"])
+            add_sheet()
+
+    def add_workbook_parts():
+        count = len(titles)
+        book.write_iter("[Content_Types].xml", iter([content_types_xml(count).encode("utf-8")]))
+        book.write_iter("_rels/.rels", iter([ROOT_RELS_XML.encode("utf-8")]))
+        book.write_iter("xl/workbook.xml", iter([workbook_xml(titles).encode("utf-8")]))
+        book.write_iter("xl/_rels/workbook.xml.rels", iter([workbook_rels_xml(count).encode("utf-8")]))
+        book.write_iter("xl/styles.xml", iter([STYLES_XML.encode("utf-8")]))
+
+    add_sheet()
+    return iter(book)
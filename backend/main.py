@@ -1,9 +1,11 @@
 import logging
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from starlette.middleware.gzip import GZipMiddleware, DEFAULT_EXCLUDED_CONTENT_TYPES
 import platform
 
 from app.api import pms_api
@@ -11,13 +13,43 @@ from app.api import pms_detail
 from app.api import pms_summary
 from app.api import pms_zip
 from app.api import gerber_api
+from app.api import pms_export
+from app.api import image_api
+from app.service.share_io import IMAGE_ROOT
+from app.service.fast_json import FastJSONResponse
+from app.service.xlsx_stream import XLSX_MEDIA_TYPE
+from app.model.schema_cache import start_schema_verification
+from app.service.export_jobs import fail_orphaned_jobs
+from app.model.inspection_norm import start_norm_view_refresh
+from app.service.summary_store import invalidate_stale_summaries, prepare_summary_store
 
 
 
 logging.basicConfig(level=logging.DEBUG)
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    start_schema_verification()
+    fail_orphaned_jobs()
+    await run_in_threadpool(prepare_summary_store)
+    start_norm_view_refresh(on_refresh=invalidate_stale_summaries)
+    yield
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Small responses are not worth the CPU; images and export files are
+# already compressed containers.
+GZIP_MIN_BYTES = int(os.getenv("PMS_GZIP_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("PMS_GZIP_LEVEL", 5))
+
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=GZIP_MIN_BYTES,
+    compresslevel=GZIP_LEVEL,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + (XLSX_MEDIA_TYPE,),
+)
 
 origins = ["http://localhost:3000"]
 
@@ -27,17 +59,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Length"],
+    expose_headers=["Content-Length", "Content-Range", "Accept-Ranges", "Content-Disposition", "ETag", "X-Crop-Size"],
 )
 
 
-BASE_PATH = r"\\10.0.0.225\ati\VS DATA"
-
-if os.path.exists(BASE_PATH):
-    print(f"[INFO] Image directory mounted: {BASE_PATH}")
-    app.mount("/images", StaticFiles(directory=BASE_PATH), name="images")
+if os.path.exists(IMAGE_ROOT):
+    print(f"[INFO] Image directory: {IMAGE_ROOT}")
 else:
-    print(f"[WARNING] Image path not found, skipping mount: {BASE_PATH}")
+    print(f"[WARNING] Image path not found: {IMAGE_ROOT}")
 
 
 app.include_router(pms_api.router)
@@ -45,3 +74,5 @@ app.include_router(pms_detail.router)
 app.include_router(pms_summary.router)
 app.include_router(pms_zip.router)
 app.include_router(gerber_api.router)
+app.include_router(pms_export.router)
+app.include_router(image_api.router)
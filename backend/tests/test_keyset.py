@@ -0,0 +1,75 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import MetaData, Table, Column, Integer, Text, Numeric, Date, create_engine, select
+
+from app.service.keyset import keyset_order, keyset_after, encode_cursor, decode_cursor
+
+metadata = MetaData()
+
+points = Table(
+    "points",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("strip_id", Text),
+    Column("bundle_no", Text),
+    Column("body_id", Text),
+)
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    rows = []
+    for i, strip in enumerate(["S1", "S1", "S2", None]):
+        for bundle in ["B1", None, "B2"]:
+            for body in ["1", None]:
+                rows.append({"strip_id": strip, "bundle_no": bundle, "body_id": f"{i}{body}" if body else None})
+    with engine.connect() as conn:
+        conn.execute(points.insert(), rows)
+        yield conn
+
+
+def page_through(conn, desc, size=4):
+    key_cols = [points.c.strip_id, points.c.bundle_no, points.c.body_id]
+    seen, cursor = [], None
+    while True:
+        stmt = select(points).order_by(*keyset_order(key_cols, desc)).limit(size + 1)
+        if cursor:
+            stmt = stmt.where(keyset_after(key_cols, decode_cursor(cursor, key_cols), desc))
+        rows = conn.execute(stmt).fetchall()
+        seen.extend(r.id for r in rows[:size])
+        if len(rows) <= size:
+            return seen
+        cursor = encode_cursor([rows[size - 1]._mapping[c.name] for c in key_cols])
+
+
+@pytest.mark.parametrize("desc", [False, True])
+def test_pages_through_null_keys(conn, desc):
+    key_cols = [points.c.strip_id, points.c.bundle_no, points.c.body_id]
+    expected = [r.id for r in conn.execute(select(points).order_by(*keyset_order(key_cols, desc)))]
+
+    assert page_through(conn, desc) == expected
+    assert len(expected) == 24
+
+
+def test_cursor_restores_column_types():
+    cols = [Column("score", Numeric), Column("day", Date), Column("unit", Text)]
+    token = encode_cursor([Decimal("1.50"), datetime.date(2024, 1, 2), None])
+
+    assert decode_cursor(token, cols) == [Decimal("1.50"), datetime.date(2024, 1, 2), None]
+
+
+def test_cursor_rejects_other_query():
+    cols = [Column("unit", Text)]
+    query_key = (7, "point", '{"afvi_ai_defect": ["SCRATCH"]}', ("B1",), None, False)
+    token = encode_cursor(["S1"], query_key)
+
+    assert decode_cursor(token, cols, query_key) == ["S1"]
+    for stale_key in [(*query_key[:5], True), (*query_key[:3], ("B2",), None, False), None]:
+        with pytest.raises(HTTPException) as err:
+            decode_cursor(token, cols, stale_key)
+        assert err.value.status_code == 400
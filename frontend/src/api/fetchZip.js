@@ -1,40 +1,55 @@
-export async function downloadZipStream(testList, excelOptions, signal, onProgress) {
-  const res = await fetch("http://localhost:8000/api/pms/download-zip", {
+const EXPORT_JOBS_URL = "http://localhost:8000/api/pms/export-jobs";
+
+export async function submitExportJob(testList, excelOptions) {
+  const res = await fetch(EXPORT_JOBS_URL, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ testList, excelOptions }),
-    signal,
   });
 
-  if (!res.ok) throw new Error("ZIP/XLSX download failed");
+  if (!res.ok) throw new Error("Export job submit failed");
+  return res.json();
+}
 
-  const reader = res.body.getReader();
-  const chunks = [];
+export async function fetchExportJob(jobId) {
+  const res = await fetch(`${EXPORT_JOBS_URL}/${jobId}`);
+  if (!res.ok) throw new Error("Export job status failed");
+  return res.json();
+}
 
-  while (true) {
-    const { done, value } = await reader.read();
-    if (done) break;
-    chunks.push(value);
-    onProgress?.(value.length);
-  }
+export function exportJobDownloadUrl(jobId) {
+  return `${EXPORT_JOBS_URL}/${jobId}/download`;
+}
+
+const POLL_INTERVAL_MS = 1000;
 
-  const blob = new Blob(chunks, { type: res.headers.get("Content-Type") });
+const sleep = (ms, signal) =>
+  new Promise((resolve, reject) => {
+    const timer = setTimeout(resolve, ms);
+    signal?.addEventListener("abort", () => {
+      clearTimeout(timer);
+      reject(new DOMException("Aborted", "AbortError"));
+    }, { once: true });
+  });
 
-  const today = new Date().toISOString().slice(0, 10);
+// Submits an export job, polls it and starts the browser download when it is done.
+export async function runExportJob(testList, excelOptions, signal, onProgress) {
+  let job = await submitExportJob(testList, excelOptions);
 
-  let filename;
-  const opts = excelOptions;
+  while (job.state === "queued" || job.state === "running") {
+    await sleep(POLL_INTERVAL_MS, signal);
+    job = await fetchExportJob(job.job_id);
+    if (job.tests_total > 0) {
+      onProgress?.(Math.floor((job.tests_done / job.tests_total) * 100));
+    }
+  }
 
-  if (opts.summary && !opts.rawdata && !opts.overkill && !opts.underkill) {
-    filename = `SUMMARY_${today}.xlsx`;
-  } else {
-    filename = `AI_RESULT_${today}.zip`;
+  if (job.state !== "done") {
+    throw new Error(job.error || "Export job failed");
   }
 
-  const url = URL.createObjectURL(blob);
   const a = document.createElement("a");
-  a.href = url;
-  a.download = filename;
+  a.href = exportJobDownloadUrl(job.job_id);
+  a.download = job.filename;
   a.click();
-  URL.revokeObjectURL(url);
 }
@@ -114,16 +114,56 @@ export async function fetchPmsData(testId,
     size = 100,
     sorters = [],
     filters = {},
-    sortConfig = null
+    sortConfig = null,
+    cursor = null
   }
 ) {
-  const payload = { mode, page, size, sorters, filters };
+  const payload = { mode, page, size, sorters, filters, format: "columnar" };
+
+  if (cursor) {
+    payload.cursor = cursor;
+  }
 
   if (sortConfig?.field) {
     payload.sort = sortConfig;
   }
 
   const { data } = await api.post(`/api/pms/detail/${testId}/data`, payload);
+
+  if (data.format === "columnar") {
+    const { columns, data: values, dictionaries, ...rest } = data;
+    return { ...rest, rows: decodeColumnarRows(columns, values, dictionaries) };
+  }
+  return data;
+}
+
+// data holds one array per column; dictionary columns hold indexes into
+// dictionaries[column] (null stays null).
+const decodeColumnarRows = (columns, values, dictionaries = {}) => {
+  const decoded = columns.map((name, c) => {
+    const dict = dictionaries[name];
+    return dict ? values[c].map((code) => (code === null ? null : dict[code])) : values[c];
+  });
+
+  const length = decoded[0]?.length ?? 0;
+  const rows = new Array(length);
+  for (let i = 0; i < length; i++) {
+    const row = {};
+    for (let c = 0; c < columns.length; c++) {
+      row[columns[c]] = decoded[c][i];
+    }
+    rows[i] = row;
+  }
+  return rows;
+};
+
+export async function fetchHeatmap(testId, { norm = [], defect = [], sorters = [], bins = 32 } = {}) {
+  const params = { bins };
+  if (norm.length > 0) params.norm = norm.join(",");
+  if (defect.length > 0) params.defect = defect.join(",");
+  if (sorters.length > 0) params.sorters = sorters.join(",");
+
+  const { data } = await api.get(`/api/pms/detail/${testId}/heatmap`, { params });
   return data;
 }
 
@@ -136,3 +176,74 @@ export async function fetchUniqueValues(testId, type = "point", sorters = []) {
 
 
 
+
+// Map keeps insertion order, so re-inserting on access makes it an LRU.
+const GERBER_CACHE_SIZE = 500;
+const gerberCrops = new Map();
+
+const gerberKey = (row) =>
+  [row.file_name, row.rel_x_unit, row.rel_y_unit, row.defect_width, row.defect_height].join("|");
+
+export const getCachedGerberCrop = (row) => {
+  const key = gerberKey(row);
+  const crop = gerberCrops.get(key);
+  if (crop !== undefined) {
+    gerberCrops.delete(key);
+    gerberCrops.set(key, crop);
+  }
+  return crop;
+};
+
+const cacheGerberCrop = (key, crop) => {
+  gerberCrops.delete(key);
+  gerberCrops.set(key, crop);
+  while (gerberCrops.size > GERBER_CACHE_SIZE) {
+    gerberCrops.delete(gerberCrops.keys().next().value);
+  }
+};
+
+export const prefetchGerberCrops = async (rows) => {
+  const pending = rows
+    .filter((r) => r.file_name && !gerberCrops.has(gerberKey(r)))
+    .slice(0, GERBER_CACHE_SIZE);
+  if (pending.length === 0) return;
+
+  try {
+    const res = await fetch(`${api.defaults.baseURL}/image/gerber/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(
+        pending.map((r) => ({
+          json_path: r.file_name,
+          cx: r.rel_x_unit,
+          cy: r.rel_y_unit,
+          defect_width: r.defect_width,
+          defect_height: r.defect_height,
+        }))
+      ),
+    });
+
+    if (!res.ok) throw new Error(`gerber batch failed: ${res.status}`);
+
+    // NDJSON: one crop per line, in completion order.
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+
+      lines.filter(Boolean).forEach((line) => {
+        const data = JSON.parse(line);
+        if (data.image) cacheGerberCrop(gerberKey(pending[data.index]), data);
+      });
+    }
+  } catch (err) {
+    console.error("prefetchGerberCrops error:", err);
+  }
+};
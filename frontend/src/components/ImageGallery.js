@@ -1,13 +1,18 @@
-import React from "react";
+import React, { useEffect } from "react";
 import "./ImageGallery.css";
+import { prefetchGerberCrops } from "../api/pmsApi";
 
 export default function ImageGallery({ rows = [], onClick }) {
  const API_BASE = process.env.REACT_APP_API_URL || "http://localhost:8000"; 
 
+ useEffect(() => {
+  prefetchGerberCrops(rows);
+ }, [rows]);
+
  const resolveImage = (p) => {
   const clean = p.replace(/_Pad\.png$/i, "_Axial.png").trim();
   const normalizedPath = clean.startsWith("/") ? clean.slice(1) : clean;
-  return `${API_BASE}/images/${encodeURI(normalizedPath)}`;
+  return `${API_BASE}/thumbs/256/${encodeURI(normalizedPath)}`;
 };
 
   
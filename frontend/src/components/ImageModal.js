@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from "react";
 import "./ImageModal.css";
 import DataTable from "../components/DataTable";
+import { getCachedGerberCrop } from "../api/pmsApi";
 
 const baseColumns = [
   { header: "AI_RESULT", accessorKey: "result" },
@@ -52,23 +53,24 @@ export default function ImageModal({ row, onClose }) {
 
       let finalImages = baseImages.filter(Boolean);
 
-      const gerberURL = `${API_BASE}/image/gerber?json_path=${encodeURIComponent(
-        row.file_name
-      )}&cx=${row.rel_x_unit}&cy=${row.rel_y_unit}&defect_width=${row.defect_width}&defect_height=${row.defect_height}`;
-
-      try {
-        const res = await fetch(gerberURL);
-        const data = await res.json();
-
-        if (data.image) {
-          finalImages.push({
-            label: `Gerber `,
-            url: `data:image/png;base64,${data.image}`,
+      const cached = getCachedGerberCrop(row);
+      const gerber = cached
+        ? { label: `Gerber `, url: `data:image/png;base64,${cached.image}` }
+        : await new Promise((resolve) => {
+            // Binary crop: the browser caches it by ETag.
+            const img = new Image();
+            const url = `${API_BASE}/image/gerber?json_path=${encodeURIComponent(
+              row.file_name
+            )}&cx=${row.rel_x_unit}&cy=${row.rel_y_unit}&defect_width=${row.defect_width}&defect_height=${row.defect_height}&format=webp`;
+            img.onload = () => resolve({ label: `Gerber `, url });
+            img.onerror = () => {
+              console.warn("Gerber fetch failed:", url);
+              resolve(null);
+            };
+            img.src = url;
           });
-        }
-      } catch (err) {
-        console.warn("Gerber fetch failed:", err);
-      }
+
+      if (gerber) finalImages.push(gerber);
 
       setImages(finalImages);
 
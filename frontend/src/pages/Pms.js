@@ -8,7 +8,7 @@ import { useNavigate, useLocation } from "react-router-dom";
 import { PiAlignBottomDuotone, PiMicrosoftExcelLogoFill, PiTrash } from "react-icons/pi";
 
 import { useGlobalProgress } from "../context/GlobalProgressContext";
-import { downloadZipStream } from "../api/fetchZip";
+import { runExportJob } from "../api/fetchZip";
 import {
   fetchPmsFilterSearch,
   fetchPmsPopupSearch,
@@ -71,6 +71,7 @@ export default function Pms() {
     summary: false,
     overkill: false,
     underkill: false,
+    format: "xlsx",
   });
 
   const toggleExcelOption = (key) => {
@@ -92,17 +93,11 @@ export default function Pms() {
     const { id, controller } = start(`Downloading ${testList.length} Lots...`);
 
     try {
-      const blob = await downloadZipStream(testList, excelOptions, controller.signal, (v) => {
-        update(id, v % 100);  
+      await runExportJob(testList, excelOptions, controller.signal, (percent) => {
+        update(id, percent);
       });
 
       finish(id);
-      const url = URL.createObjectURL(blob);
-      const a = document.createElement("a");
-      a.href = url;
-      a.download = `AI_RESULT_${new Date().toISOString().slice(0,10)}.zip`;
-      a.click();
-      URL.revokeObjectURL(url);
 
     } catch (err) {
       cancel(id);
@@ -517,7 +512,7 @@ export default function Pms() {
             <div className="modal-body">
               <div className="option-group">
 
-                {Object.keys(excelOptions).map((key) => (
+                {Object.keys(excelOptions).filter((key) => key !== "format").map((key) => (
                   <label key={key} style={{ display: "block", margin: "6px 0" }}>
                     <input
                       type="checkbox"
@@ -533,6 +528,19 @@ export default function Pms() {
                     }[key]}
                   </label>
                 ))}
+
+                <label style={{ display: "block", margin: "10px 0 6px" }}>
+                  Format
+                  <select
+                    value={excelOptions.format}
+                    onChange={(e) => setExcelOptions((prev) => ({ ...prev, format: e.target.value }))}
+                    style={{ marginLeft: "6px" }}
+                  >
+                    <option value="xlsx">Excel (.xlsx)</option>
+                    <option value="parquet">Parquet (.parquet)</option>
+                    <option value="arrow">Arrow IPC (.arrow)</option>
+                  </select>
+                </label>
               </div>
             </div>
 
@@ -65,6 +65,7 @@ export default function PmsDetail() {
 
   const [page, setPage] = useState(1);
   const pageSize = 100;
+  const cursorRef = useRef(null);
 
   const handleRowClick = (row) => setSelectedRow(row);
 
@@ -117,9 +118,11 @@ export default function PmsDetail() {
         size: pageSize,
         sorters: sorterValues,
         filters: filtersState,
-        ...(sortConfig.field && { sortConfig })
+        ...(sortConfig.field && { sortConfig }),
+        cursor: p === page + 1 ? cursorRef.current : null,
       });
 
+      cursorRef.current = res.cursor ?? null;
       setRows(res.rows ?? []);
       setTotalCount(res.total ?? 0);
       setPage(p);
@@ -131,6 +134,12 @@ export default function PmsDetail() {
     }
   }
 
+  // A cursor only continues the query it came from; drop it before any
+  // refetch triggered by a new sort, filter, sorter set or view.
+  useEffect(() => {
+    cursorRef.current = null;
+  }, [filtersState, sorterValues.join(","), selectedViewOption, sortConfig]);
+
   useEffect(() => {
     if (selectedViewOption === "summary") return;
 